@@ -0,0 +1,806 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Spine Server
+
+Measures how fast spine_server.py matches spine files to books and how
+fast it serves them, so a change can be checked for speed-ups or
+regressions before it ships.
+
+WHAT THIS DOES:
+  1. generate  Writes a synthetic ABS catalog and a spines folder of any
+               size (1k–200k books), with the kind of naming noise real
+               folders have: typos, underscores, "Author - Title",
+               dropped subtitles, stray files that match nothing
+  2. fake-abs  Serves a generated catalog like ABS does, so a real spine
+               server can be started against it
+  3. micro     Times normalize, build_title_index, match_filename_to_book
+               and find_spine_files in-process, and checks how many
+               generated files matched the book they were made for
+  4. load      Throughput and latency of a running spine server
+  5. compare   Puts two results files side by side
+
+Every run writes its results to a JSON file (see --output), together with
+the Python version, machine and git commit, so runs can be compared later.
+
+ZERO DEPENDENCIES - just Python 3.6+, like the server itself.
+
+Usage:
+  python3 benchmark.py micro                              # 1k, 10k and 50k books
+  python3 benchmark.py micro --books 200000 --repeat 3
+  python3 benchmark.py generate /tmp/bench --books 20000  # catalog + spines folder
+  python3 benchmark.py fake-abs /tmp/bench --port 13399   # serve that catalog as ABS
+  python3 benchmark.py load http://localhost:8786 --concurrency 32 --duration 10
+  python3 benchmark.py compare before.json after.json
+
+A full serving benchmark against a generated library:
+  python3 benchmark.py generate /tmp/bench --books 20000
+  python3 benchmark.py fake-abs /tmp/bench --port 13399 &
+  ABS_URL=http://localhost:13399 ABS_API_KEY=bench SPINES_DIR=/tmp/bench/spines \\
+      python3 spine_server.py --port 8786 &
+  python3 benchmark.py load http://localhost:8786
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import gzip
+import zlib
+import random
+import shutil
+import struct
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import argparse
+import http.client
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import spine_server  # noqa: E402
+
+
+# =============================================================================
+# SETTINGS
+# =============================================================================
+
+# Library sizes the micro benchmarks run at unless --books says otherwise
+DEFAULT_BOOK_COUNTS = (1000, 10000, 50000)
+
+# Timed runs per micro benchmark; the median is what gets compared
+DEFAULT_REPEAT = 5
+
+# Share of generated books that get a spine file
+DEFAULT_SPINE_RATIO = 0.5
+
+# Seed for the generator, so the same size always makes the same library
+DEFAULT_SEED = 1
+
+# Load test defaults: simultaneous connections and seconds per scenario
+DEFAULT_CONCURRENCY = 16
+DEFAULT_DURATION = 10
+WARMUP_SECONDS = 1
+
+# IDs per request in the "batch" load scenario
+LOAD_BATCH_IDS = 50
+
+# Books per library in a generated catalog
+LIBRARY_SIZE = 50000
+
+RESULTS_VERSION = 1
+
+
+# =============================================================================
+# SYNTHETIC LIBRARY
+# =============================================================================
+
+ADJECTIVES = [
+    "Silent", "Broken", "Golden", "Last", "Hidden", "Burning", "Lost", "Iron",
+    "Crimson", "Endless", "Forgotten", "Wild", "Dark", "Bright", "Hollow",
+    "Winter", "Secret", "Shattered", "Distant", "Quiet", "Little", "Savage",
+]
+NOUNS = [
+    "Sea", "Crown", "Garden", "Empire", "River", "City", "Star", "Kingdom",
+    "Shadow", "Night", "Storm", "Mountain", "Library", "Road", "Fire",
+    "Orchard", "Machine", "Door", "Forest", "Island", "Witness", "Heir",
+    "Promise", "Daughter", "Engine", "House", "Tide", "Wolf", "Mirror",
+]
+FIRST_NAMES = [
+    "Anna", "Frank", "Ursula", "Neil", "Octavia", "Terry", "Brandon", "Robin",
+    "Ann", "Kazuo", "Mary", "Iain", "Lois", "Joe", "Naomi", "Ted", "Jo",
+    "Martha", "Adrian", "N. K.", "José", "Zoë", "Chimamanda", "Haruki",
+]
+SYLLABLES = [
+    "ka", "ther", "ion", "dra", "mor", "el", "va", "rin", "tor", "sha", "len",
+    "qua", "bel", "dun", "ash", "or", "vy", "zen", "lo", "mir", "ga", "thal",
+]
+TITLE_PATTERNS = [
+    "The {adj} {noun}",
+    "{Word}",
+    "{noun} of {Word}",
+    "The {Word} {noun}",
+    "{adj} {noun}: A {Word} Novel",
+    "{Word}’s {noun}",
+    "{Word}'s {noun}",
+    "The {noun} and the {noun2}",
+    "{Word} Chronicles: Book {n}",
+    "A {noun} for {Word}",
+    "{Word} - {adj} {noun}",
+    "An {Word} {noun}",
+]
+JUNK_NAMES = ["IMG_{n:04d}", "scan {n}", "spine-{n}", "Untitled {n}", "cover_{n:05d}", "DSC{n:05d}"]
+
+# How generated spine files are named, and how often: (naming, weight)
+FILE_NAMINGS = [
+    ("id", 15),
+    ("title", 25),
+    ("author-title", 12),
+    ("title-author", 4),
+    ("underscores", 10),
+    ("lowercase", 5),
+    ("typo", 10),
+    ("no-subtitle", 5),
+    ("no-article", 4),
+    ("partial", 4),
+    ("junk", 6),
+]
+
+SPINE_EXTENSIONS = [(".png", 80), (".jpg", 15), (".webp", 5)]
+
+
+def invented_word(rng):
+    word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    if rng.random() < 0.03:
+        word = word.replace("e", "é", 1)  # the odd accent
+    return word
+
+
+def make_title(rng):
+    pattern = rng.choice(TITLE_PATTERNS)
+    return pattern.format(
+        adj=rng.choice(ADJECTIVES),
+        noun=rng.choice(NOUNS),
+        noun2=rng.choice(NOUNS),
+        Word=invented_word(rng),
+        n=rng.randint(1, 12),
+    )
+
+
+def make_author(rng):
+    return f"{rng.choice(FIRST_NAMES)} {invented_word(rng)}"
+
+
+def generate_books(count, seed=DEFAULT_SEED):
+    """
+    `count` synthetic books as ABS library items (the fields the server
+    reads). About 1% reuse an earlier title under another author, like
+    two different books called "Persuasion".
+    """
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+    items = []
+    for i in range(count):
+        if items and rng.random() < 0.01:
+            title = rng.choice(items)["media"]["metadata"]["title"]
+        else:
+            title = make_title(rng)
+        items.append({
+            "id": f"li_{rng.getrandbits(64):016x}",
+            "path": f"/audiobooks/{i}",
+            "addedAt": now - (count - i) * 1000,
+            "updatedAt": now - (count - i) * 1000,
+            "media": {"metadata": {"title": title, "authorName": make_author(rng)}},
+        })
+    return items
+
+
+def add_typo(text, rng):
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.randrange(4)
+    if op == 0:
+        return text[:i] + text[i + 1:]                        # dropped letter
+    if op == 1:
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]  # swapped letters
+    if op == 2:
+        return text[:i] + text[i] + text[i:]                  # doubled letter
+    return text[:i] + rng.choice("aeiorstn") + text[i + 1:]   # wrong letter
+
+
+def spine_filename(item, naming, rng, serial):
+    """The stem of a spine file for `item`, named the way `naming` says."""
+    metadata = item["media"]["metadata"]
+    title, author = metadata["title"], metadata["authorName"]
+    if naming == "id":
+        return item["id"]
+    if naming == "author-title":
+        return f"{author} - {title}"
+    if naming == "title-author":
+        return f"{title} - {author}"
+    if naming == "underscores":
+        return title.replace(" ", "_")
+    if naming == "lowercase":
+        return "".join(c for c in title.lower() if c.isalnum() or c == " ")
+    if naming == "typo":
+        return add_typo(title, rng)
+    if naming == "no-subtitle":
+        return title.split(":")[0].split(" - ")[0]
+    if naming == "no-article":
+        for article in ("The ", "A ", "An "):
+            if title.startswith(article):
+                return title[len(article):]
+        return title
+    if naming == "partial":
+        words = title.split()
+        return " ".join(words[:max(2, len(words) - 1)])
+    if naming == "junk":
+        return rng.choice(JUNK_NAMES).format(n=serial)
+    return title
+
+
+def spine_png(seed):
+    """A small valid PNG spine (24x96, one flat colour picked by `seed`)."""
+    width, height = 24, 96
+    r, g, b = (seed * 2654435761 >> shift & 0xFF for shift in (0, 8, 16))
+    row = b"\x00" + bytes((r, g, b)) * width
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+def generate_spines(items, folder, ratio=DEFAULT_SPINE_RATIO, seed=DEFAULT_SEED):
+    """
+    Write spine files for a random `ratio` of `items` into `folder`, named
+    with FILE_NAMINGS noise. Returns filename → the book ID it was made
+    for (None for junk files that shouldn't match anything).
+
+    Every file holds the same kind of tiny PNG whatever its extension;
+    the server only looks at names and headers when matching.
+    """
+    rng = random.Random(seed + 1)
+    namings = [n for n, _ in FILE_NAMINGS]
+    naming_weights = [w for _, w in FILE_NAMINGS]
+    extensions = [e for e, _ in SPINE_EXTENSIONS]
+    extension_weights = [w for _, w in SPINE_EXTENSIONS]
+
+    os.makedirs(folder, exist_ok=True)
+    expected = {}
+    chosen = rng.sample(items, int(len(items) * ratio))
+    for serial, item in enumerate(chosen):
+        naming = rng.choices(namings, naming_weights)[0]
+        stem = spine_filename(item, naming, rng, serial).replace("/", "-").replace(":", "")
+        filename = stem + rng.choices(extensions, extension_weights)[0]
+        if filename in expected or not stem.strip():
+            filename = item["id"] + ".png"
+        expected[filename] = None if naming == "junk" else item["id"]
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(spine_png(serial))
+    return expected
+
+
+def catalog_libraries(items):
+    """Split generated items into ABS libraries of up to LIBRARY_SIZE books."""
+    return [
+        {"id": f"lib_bench{n}", "name": f"Bench {n + 1}", "items": items[start:start + LIBRARY_SIZE]}
+        for n, start in enumerate(range(0, len(items), LIBRARY_SIZE))
+    ]
+
+
+def books_from_items(items):
+    """Generated items as the book dicts spine_server builds its index from."""
+    return [spine_server.book_from_item(item, "lib_bench", "Bench") for item in items]
+
+
+def cmd_generate(folder, books, ratio, seed):
+    started = time.perf_counter()
+    items = generate_books(books, seed)
+    expected = generate_spines(items, os.path.join(folder, "spines"), ratio, seed)
+    with open(os.path.join(folder, "catalog.json"), "w") as f:
+        json.dump({"libraries": catalog_libraries(items)}, f, separators=(",", ":"))
+    with open(os.path.join(folder, "expected.json"), "w") as f:
+        json.dump(expected, f, indent=0, sort_keys=True)
+    print(f"Generated {books} books and {len(expected)} spine files in {folder} "
+          f"({time.perf_counter() - started:.1f}s)")
+    print(f"  {folder}/catalog.json   - serve it with: python3 benchmark.py fake-abs {folder}")
+    print(f"  {folder}/spines/        - use as SPINES_DIR")
+    print(f"  {folder}/expected.json  - which book each file was made for")
+
+
+# =============================================================================
+# FAKE ABS
+# =============================================================================
+
+class FakeABSHandler(BaseHTTPRequestHandler):
+    """
+    Answers the two ABS endpoints the spine server uses: the library list,
+    and paged library items sorted by addedAt or updatedAt. Any bearer
+    token is accepted.
+    """
+
+    protocol_version = "HTTP/1.1"
+    libraries = []
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+
+        if url.path == "/api/libraries":
+            body = {"libraries": [{"id": lib["id"], "name": lib["name"]} for lib in self.libraries]}
+        elif len(parts) == 4 and parts[:2] == ["api", "libraries"] and parts[3] == "items":
+            lib = next((lib for lib in self.libraries if lib["id"] == parts[2]), None)
+            if lib is None:
+                self.send_error(404)
+                return
+            items = lib["items"]
+            sort = params.get("sort", ["addedAt"])[0]
+            if sort == "updatedAt" or params.get("desc", ["0"])[0] == "1":
+                items = sorted(items, key=lambda x: x.get(sort, 0), reverse=params.get("desc", ["0"])[0] == "1")
+            limit = int(params.get("limit", ["0"])[0])
+            page = int(params.get("page", ["0"])[0])
+            results = items[page * limit:(page + 1) * limit] if limit else items
+            body = {"results": results, "total": len(items), "limit": limit, "page": page}
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def cmd_fake_abs(folder, port):
+    with open(os.path.join(folder, "catalog.json")) as f:
+        FakeABSHandler.libraries = json.load(f)["libraries"]
+    count = sum(len(lib["items"]) for lib in FakeABSHandler.libraries)
+    server = ThreadingHTTPServer(("0.0.0.0", port), FakeABSHandler)
+    print(f"Fake ABS with {count} books at http://localhost:{port} (any API key works)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+# =============================================================================
+# MICRO BENCHMARKS
+# =============================================================================
+
+def measure(fn, repeat):
+    """Run `fn` `repeat` times; returns each run's wall time in seconds."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def timing_result(name, books, ops, times):
+    median = statistics.median(times)
+    return {
+        "suite": "micro",
+        "name": name,
+        "books": books,
+        "ops": ops,
+        "repeat": len(times),
+        "best_seconds": round(min(times), 6),
+        "median_seconds": round(median, 6),
+        "per_op_us": round(median / ops * 1e6, 3) if ops else None,
+    }
+
+
+def print_timing(result):
+    per_op = f"{result['per_op_us']:>10.2f}us/op" if result["per_op_us"] is not None else ""
+    print(f"  {result['name']:<26} {result['median_seconds'] * 1000:>11.2f}ms "
+          f"(best {result['best_seconds'] * 1000:.2f}ms) {result['ops']:>9} ops {per_op}")
+
+
+def match_accuracy(decisions, expected):
+    """How the match decisions compare with the books the files were made for."""
+    counts = {"correct": 0, "wrong": 0, "unmatched": 0, "junk_matched": 0, "junk_unmatched": 0}
+    for filename, (book_id, _) in decisions.items():
+        wanted = expected[filename]
+        if wanted is None:
+            counts["junk_matched" if book_id else "junk_unmatched"] += 1
+        elif book_id is None:
+            counts["unmatched"] += 1
+        else:
+            counts["correct" if book_id == wanted else "wrong"] += 1
+    return counts
+
+
+def run_micro(books, repeat, ratio, seed):
+    """Micro benchmarks for one library size. Returns a list of result dicts."""
+    print(f"{books} books:")
+    results = []
+    items = generate_books(books, seed)
+    book_dicts = books_from_items(items)
+    folder = tempfile.mkdtemp(prefix="spine-bench-")
+    try:
+        expected = generate_spines(items, os.path.join(folder, "spines"), ratio, seed)
+        stems = {filename: os.path.splitext(filename)[0] for filename in expected}
+
+        texts = [b["title"] for b in book_dicts] + [b["author"] for b in book_dicts] + list(stems.values())
+        times = measure(lambda: [spine_server.normalize(t) for t in texts], repeat)
+        results.append(timing_result("normalize", books, len(texts), times))
+
+        times = measure(lambda: spine_server.build_title_index(book_dicts), repeat)
+        results.append(timing_result("build_title_index", books, len(book_dicts), times))
+
+        title_index, collisions = spine_server.build_title_index(book_dicts)
+        times = measure(lambda: spine_server.FuzzyIndex(title_index), repeat)
+        results.append(timing_result("FuzzyIndex", books, len(title_index), times))
+
+        fuzzy_index = spine_server.FuzzyIndex(title_index)
+        decisions = {}
+
+        def match_all():
+            for filename, stem in stems.items():
+                decisions[filename] = spine_server.match_filename_to_book(stem, title_index, fuzzy_index)
+
+        times = measure(match_all, repeat)
+        match_result = timing_result("match_filename_to_book", books, len(stems), times)
+        match_result["accuracy"] = match_accuracy(decisions, expected)
+        results.append(match_result)
+
+        spine_server.install_book_index({b["id"]: b for b in book_dicts}, title_index, collisions)
+        spine_server._override_spines_dir(os.path.join(folder, "spines"))
+        spine_server._override_cache_dir(os.path.join(folder, "cache"))
+        times = measure(spine_server.find_spine_files, repeat)
+        results.append(timing_result("find_spine_files", books, len(stems), times))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    for result in results:
+        print_timing(result)
+    accuracy = match_result["accuracy"]
+    titled = accuracy["correct"] + accuracy["wrong"] + accuracy["unmatched"]
+    print(f"  matched {accuracy['correct']}/{titled} files to the right book, "
+          f"{accuracy['wrong']} wrong, {accuracy['unmatched']} unmatched; "
+          f"{accuracy['junk_matched']} of {accuracy['junk_matched'] + accuracy['junk_unmatched']} junk files matched")
+    return results
+
+
+def cmd_micro(book_counts, repeat, ratio, seed):
+    results = []
+    for books in book_counts:
+        results.extend(run_micro(books, repeat, ratio, seed))
+    params = {"books": list(book_counts), "repeat": repeat, "spine_ratio": ratio, "seed": seed}
+    return params, results
+
+
+# =============================================================================
+# LOAD TESTS
+# =============================================================================
+
+# name → function(ids, etag, rng) giving the (path, headers) of one request
+LOAD_SCENARIOS = {
+    "manifest": lambda ids, etag, rng: ("/api/spines/manifest", {"Accept-Encoding": "gzip"}),
+    "manifest-304": lambda ids, etag, rng: (
+        "/api/spines/manifest", {"Accept-Encoding": "gzip", "If-None-Match": etag or "*"}),
+    "spines": lambda ids, etag, rng: (f"/api/items/{rng.choice(ids)}/spine", {}),
+    "resized": lambda ids, etag, rng: (f"/api/items/{rng.choice(ids)}/spine?h=300", {}),
+    "batch": lambda ids, etag, rng: (
+        "/api/spines/batch?ids=" + ",".join(rng.sample(ids, min(LOAD_BATCH_IDS, len(ids)))), {}),
+}
+DEFAULT_SCENARIOS = ("manifest", "manifest-304", "spines", "batch")
+
+
+def _connect(url):
+    if url.scheme == "https":
+        return http.client.HTTPSConnection(url.hostname, url.port, timeout=30)
+    return http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+
+
+def fetch_manifest(base):
+    """
+    (book IDs, ETag) from a running server's manifest. It's asked for
+    gzipped, like the load scenarios do, because the ETag differs per
+    encoding.
+    """
+    url = urllib.parse.urlsplit(base)
+    conn = _connect(url)
+    try:
+        conn.request("GET", url.path.rstrip("/") + "/api/spines/manifest", headers={"Accept-Encoding": "gzip"})
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            raise SystemExit(f"{base}/api/spines/manifest answered {resp.status}")
+        if resp.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)["items"], resp.getheader("ETag")
+    except (OSError, http.client.HTTPException) as e:
+        raise SystemExit(f"Cannot reach the spine server at {base}: {e}")
+    finally:
+        conn.close()
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(base, scenario, ids, etag, concurrency, duration):
+    """
+    Fire `scenario` requests from `concurrency` keep-alive connections for
+    `duration` seconds (after a short warm-up). Returns a result dict.
+
+    The client is threaded Python too, so against a fast server on the
+    same machine it can become the bottleneck; compare runs made the same
+    way rather than reading the numbers as absolutes.
+    """
+    url = urllib.parse.urlsplit(base)
+    prefix = url.path.rstrip("/")
+    make_request = LOAD_SCENARIOS[scenario]
+    barrier = threading.Barrier(concurrency + 1)
+    window = {}
+    per_thread = []
+
+    def client(n):
+        rng = random.Random(n)
+        latencies, statuses, sent = [], {}, [0, 0]  # bytes, errors
+        per_thread.append((latencies, statuses, sent))
+        conn = _connect(url)
+        barrier.wait()
+        while True:
+            now = time.perf_counter()
+            if now >= window["end"]:
+                break
+            path, headers = make_request(ids, etag, rng)
+            try:
+                conn.request("GET", prefix + path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = _connect(url)
+                if now >= window["start"]:
+                    sent[1] += 1
+                continue
+            if now >= window["start"]:
+                latencies.append(time.perf_counter() - now)
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                sent[0] += len(body)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    window["start"] = time.perf_counter() + WARMUP_SECONDS
+    window["end"] = window["start"] + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(x for lats, _, _ in per_thread for x in lats)
+    statuses = {}
+    for _, counts, _ in per_thread:
+        for status, count in counts.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    total_bytes = sum(sent[0] for _, _, sent in per_thread)
+    errors = sum(sent[1] for _, _, sent in per_thread)
+    return {
+        "suite": "load",
+        "name": scenario,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "mb_per_second": round(total_bytes / duration / 1e6, 3),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def cmd_load(base, scenarios, concurrency, duration):
+    ids, etag = fetch_manifest(base)
+    if not ids:
+        raise SystemExit(f"{base} has no spines to fetch; point SPINES_DIR at a generated spines folder")
+    print(f"{base}: {len(ids)} spines, {concurrency} connections, {duration}s per scenario")
+    print(f"  {'scenario':<14} {'req/s':>9} {'MB/s':>8} {'p50':>8} {'p90':>8} {'p99':>8}  statuses")
+    results = []
+    for scenario in scenarios:
+        result = run_load(base, scenario, ids, etag, concurrency, duration)
+        latency = result["latency_ms"]
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(result["statuses"].items()))
+        if result["errors"]:
+            statuses += f", errors: {result['errors']}"
+        print(f"  {scenario:<14} {result['requests_per_second']:>9.1f} {result['mb_per_second']:>8.2f} "
+              f"{latency['p50']:>6.2f}ms {latency['p90']:>6.2f}ms {latency['p99']:>6.2f}ms  {statuses}")
+        results.append(result)
+    params = {"url": base, "scenarios": list(scenarios), "concurrency": concurrency, "duration": duration}
+    return params, results
+
+
+# =============================================================================
+# RESULTS
+# =============================================================================
+
+def git_commit():
+    """Short hash of the checked-out commit (with "+dirty" if modified), or None."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=here, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = subprocess.call(
+            ["git", "diff", "--quiet", "HEAD", "--", "."], cwd=here, stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if dirty else "")
+
+
+def write_results(path, suite, params, results):
+    data = {
+        "version": RESULTS_VERSION,
+        "suite": suite,
+        "recorded": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "match_rules_version": spine_server.MATCH_RULES_VERSION,
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+def result_key(result):
+    if result["suite"] == "micro":
+        return (result["suite"], result["name"], result["books"])
+    return (result["suite"], result["name"], result["concurrency"])
+
+
+def result_figures(result):
+    """(label, value, higher_is_better) figures compared between runs."""
+    if result["suite"] == "micro":
+        return [("median ms", result["median_seconds"] * 1000, False)]
+    return [
+        ("req/s", result["requests_per_second"], True),
+        ("p99 ms", result["latency_ms"]["p99"], False),
+    ]
+
+
+def cmd_compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before_path} ({before.get('commit') or 'unknown commit'}, {before['recorded']})")
+    print(f"after:  {after_path} ({after.get('commit') or 'unknown commit'}, {after['recorded']})")
+    old = {result_key(r): r for r in before["results"]}
+    for result in after["results"]:
+        key = result_key(result)
+        if key not in old:
+            continue
+        size = f"{key[2]} books" if key[0] == "micro" else f"x{key[2]}"
+        for (label, then, bigger), (_, now, _) in zip(result_figures(old[key]), result_figures(result)):
+            change = (now - then) / then * 100 if then else 0.0
+            better = (change > 0) == bigger
+            verdict = "better" if abs(change) >= 5 and better else "worse" if abs(change) >= 5 else ""
+            print(f"  {key[1]:<24} {size:<12} {label:<10} {then:>11.2f} → {now:>11.2f} "
+                  f"{change:>+7.1f}%  {verdict}")
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def default_output(suite):
+    return f"benchmark-{suite}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+
+
+def book_counts(text):
+    counts = tuple(int(n) for n in text.split(",") if n.strip())
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of book counts")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for the Spine Server",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Run `python3 benchmark.py COMMAND --help` for each command's options.",
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    generate = commands.add_parser("generate", help="Write a synthetic catalog and spines folder")
+    generate.add_argument("folder", help="Where to write catalog.json, expected.json and spines/")
+    generate.add_argument("--books", type=int, default=DEFAULT_BOOK_COUNTS[1],
+                          help=f"Books in the catalog (default: {DEFAULT_BOOK_COUNTS[1]})")
+    generate.add_argument("--spine-ratio", type=float, default=DEFAULT_SPINE_RATIO,
+                          help=f"Share of books that get a spine file (default: {DEFAULT_SPINE_RATIO})")
+    generate.add_argument("--seed", type=int, default=DEFAULT_SEED)
+
+    fake_abs = commands.add_parser("fake-abs", help="Serve a generated catalog as a fake ABS")
+    fake_abs.add_argument("folder", help="A folder made by the generate command")
+    fake_abs.add_argument("--port", type=int, default=13399, help="Port to listen on (default: 13399)")
+
+    micro = commands.add_parser("micro", help="Time the matching functions in-process")
+    micro.add_argument("--books", type=book_counts, default=DEFAULT_BOOK_COUNTS,
+                       help="Comma-separated library sizes (default: "
+                            f"{','.join(str(n) for n in DEFAULT_BOOK_COUNTS)})")
+    micro.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                       help=f"Timed runs per benchmark (default: {DEFAULT_REPEAT})")
+    micro.add_argument("--spine-ratio", type=float, default=DEFAULT_SPINE_RATIO,
+                       help=f"Share of books that get a spine file (default: {DEFAULT_SPINE_RATIO})")
+    micro.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    micro.add_argument("--output", help="Results file (default: benchmark-micro-TIMESTAMP.json)")
+
+    load = commands.add_parser("load", help="Measure throughput and latency of a running server")
+    load.add_argument("url", help="The spine server, e.g. http://localhost:8786")
+    load.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                      help=f"Comma-separated, from: {', '.join(LOAD_SCENARIOS)} "
+                           f"(default: {','.join(DEFAULT_SCENARIOS)})")
+    load.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                      help=f"Simultaneous keep-alive connections (default: {DEFAULT_CONCURRENCY})")
+    load.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                      help=f"Seconds per scenario (default: {DEFAULT_DURATION})")
+    load.add_argument("--output", help="Results file (default: benchmark-load-TIMESTAMP.json)")
+
+    compare = commands.add_parser("compare", help="Compare two results files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        cmd_generate(args.folder, args.books, args.spine_ratio, args.seed)
+    elif args.command == "fake-abs":
+        cmd_fake_abs(args.folder, args.port)
+    elif args.command == "micro":
+        params, results = cmd_micro(args.books, args.repeat, args.spine_ratio, args.seed)
+        write_results(args.output or default_output("micro"), "micro", params, results)
+    elif args.command == "load":
+        scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+        unknown = [s for s in scenarios if s not in LOAD_SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+        params, results = cmd_load(args.url, scenarios, args.concurrency, args.duration)
+        write_results(args.output or default_output("load"), "load", params, results)
+    elif args.command == "compare":
+        cmd_compare(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,12 +29,18 @@ SETUP:
      and enter this server's address (e.g. http://192.168.1.100:8786)
 
 ZERO DEPENDENCIES - just Python 3.6+, nothing to install.
+(Optional: Pillow enables atlases, resizing and WebP/AVIF copies;
+brotli shrinks the manifest.)
 
 Usage:
   python3 spine_server.py                    # Start the server
   python3 spine_server.py --list-books       # Show all books with their IDs
   python3 spine_server.py --scan-library     # Find spine.png files in your ABS library
+  python3 spine_server.py --make-variants    # Pre-encode WebP/AVIF copies (needs Pillow)
   python3 spine_server.py --port 9000        # Use a different port
+  python3 spine_server.py --threads 32       # Serve with 32 worker threads
+  python3 spine_server.py --workers 4        # Serve from 4 processes (Linux/BSD)
+  python3 spine_server.py --profile          # Time startup and rescan phases
 """
 
 import os
@@ -42,15 +48,51 @@ import re
 import sys
 import json
 import time
+import collections
+import gzip
+import stat
+import hashlib
+import heapq
+import io
+import math
+import errno
+import bisect
+import select
+import signal
+import socket
+import struct
+import ctypes
+import cProfile
+import queue
+import tempfile
+import threading
 import unicodedata
+from array import array
 import argparse
 import mimetypes
-import urllib.request
-import urllib.error
+import email.utils
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from datetime import datetime
 
+# Optional: Brotli shrinks the manifest a little further than gzip.
+# Nothing breaks without it (pip install brotli).
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Optional: Pillow builds spine atlases and resized spines (pip install
+# Pillow). Without it the atlas endpoint answers 501, ?h=/?w= are ignored,
+# and everything else works as usual.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 # =============================================================================
 # CONFIGURATION — Change these to match YOUR setup
 # =============================================================================
@@ -64,6 +106,33 @@ ABS_API_KEY = os.environ.get("ABS_API_KEY", "")
 # Port this spine server will listen on
 DEFAULT_PORT = 8786
 
+# Number of worker threads handling connections (0 = single-threaded).
+# The app opens a shelf by firing hundreds of spine requests at once, so a
+# pool keeps one slow client from stalling everyone else.
+DEFAULT_THREADS = 16
+
+# Seconds a client may take to send a request once it has started one
+REQUEST_TIMEOUT = 15
+
+# Seconds an idle keep-alive connection may hold a worker before it is
+# closed. Every idle connection pins one pool thread, so this stays short;
+# a connection is also closed at once when others are waiting for a thread.
+KEEPALIVE_TIMEOUT = 2
+
+# Seconds between checks for queued connections while a keep-alive
+# connection sits idle
+KEEPALIVE_POLL = 0.05
+
+# Seconds between background re-scans of the spines folder
+SCAN_INTERVAL = 30
+
+# Memory for caching spine image bytes, in MB (0 = read from disk every time)
+CACHE_MB = 64
+
+# False-positive rate of the Bloom-filter manifest (?format=bloom) when the
+# app doesn't ask for a specific one with &fp=
+BLOOM_FP_RATE = 0.01
+
 # Folder where you put your spine images
 SPINES_DIR = os.environ.get("SPINES_DIR", os.path.join(os.path.dirname(__file__) or ".", "spines"))
 
@@ -72,36 +141,424 @@ SPINES_DIR = os.environ.get("SPINES_DIR", os.path.join(os.path.dirname(__file__)
 # Example: /mnt/audiobooks  or  /audiobooks  or  C:\Audiobooks
 LIBRARY_PATH = os.environ.get("LIBRARY_PATH", "")
 
+# Where the server keeps its own bookkeeping files (match decisions etc.).
+# Empty means a hidden ".spine-cache" folder inside SPINES_DIR, so the
+# cache lives on the same volume as the spines and survives restarts.
+CACHE_DIR = os.environ.get("CACHE_DIR", "")
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+# Histogram buckets for durations, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms, rendered by /metrics in the
+    Prometheus text exposition format.
+
+    Recording is a dict update under one lock, cheap enough for every
+    request. Values that are already kept elsewhere (cache stats, index
+    size) aren't duplicated: collector functions registered with
+    collect() copy them into gauges just before rendering.
+    """
+
+    def __init__(self):
+        self._kinds = {}      # name → (type, help text)
+        self._values = {}     # (name, labels) → number
+        self._histograms = {}  # (name, labels) → [count per bucket..., +Inf count, sum]
+        self._base_values = {}      # counters carried over from a previous process
+        self._base_histograms = {}  # (see continue_from)
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self._kinds[name] = (kind, text)
+
+    def collect(self, collector):
+        """Call `collector()` before every render; it should set() gauges."""
+        self._collectors.append(collector)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            counts[slot] += 1
+            counts[-1] += value
+
+    def export(self):
+        """
+        All samples as plain JSON-able data, counters and histograms
+        including anything carried over by continue_from().
+        """
+        self._run_collectors()
+        with self._lock:
+            values = dict(self._base_values)
+            for key, value in self._values.items():
+                if key in values:
+                    value += values[key]  # only counters have a base
+                values[key] = value
+            histograms = {key: list(counts) for key, counts in self._base_histograms.items()}
+            for key, counts in self._histograms.items():
+                base = histograms.get(key)
+                histograms[key] = [a + b for a, b in zip(base, counts)] if base else list(counts)
+        return {
+            "values": [[name, [list(label) for label in labels], value] for (name, labels), value in values.items()],
+            "histograms": [[name, [list(label) for label in labels], counts]
+                           for (name, labels), counts in histograms.items()],
+        }
+
+    def add(self, data):
+        """Add samples from another process's export() to these, gauges included."""
+        with self._lock:
+            for name, labels, value in data["values"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self._values[key] = self._values.get(key, 0) + value
+            for name, labels, counts in data["histograms"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                mine = self._histograms.get(key)
+                self._histograms[key] = [a + b for a, b in zip(mine, counts)] if mine else list(counts)
+
+    def continue_from(self, data):
+        """
+        Carry on from the counters and histograms of a process this one
+        replaces, so the totals it exports don't start again from zero.
+        Gauges describe the old process and are dropped.
+        """
+        with self._lock:
+            for name, labels, value in data["values"]:
+                if self._kinds.get(name, ("",))[0] == "counter":
+                    self._base_values[(name, tuple(tuple(label) for label in labels))] = value
+            for name, labels, counts in data["histograms"]:
+                self._base_histograms[(name, tuple(tuple(label) for label in labels))] = counts
+
+    def _run_collectors(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+
+    def render(self):
+        """All metrics with at least one sample, as exposition-format text."""
+        self._run_collectors()
+
+        with self._lock:
+            samples = {}
+            for (name, labels), value in self._values.items():
+                samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (name, labels), counts in self._histograms.items():
+                lines = samples.setdefault(name, [])
+                total = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                    total += count
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {total}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {counts[-1]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {total}")
+
+        out = []
+        for name in sorted(samples):
+            kind, text = self._kinds.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(samples[name])
+        return "\n".join(out) + "\n" if out else ""
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+_metrics = Metrics()
+_metrics.describe("spine_http_requests_total", "counter", "HTTP requests by route and status code.")
+_metrics.describe("spine_http_request_duration_seconds", "histogram", "Time to answer an HTTP request, by route.")
+_metrics.describe("spine_http_response_bytes_total", "counter", "Response body bytes sent, by route.")
+_metrics.describe("spine_image_cache_hits_total", "counter", "Spine image byte cache hits.")
+_metrics.describe("spine_image_cache_misses_total", "counter", "Spine image byte cache misses.")
+_metrics.describe("spine_image_cache_bytes", "gauge", "Bytes held in the spine image byte cache.")
+_metrics.describe("spine_image_cache_entries", "gauge", "Images held in the spine image byte cache.")
+_metrics.describe("spine_match_cache_hits_total", "counter", "Spine files whose remembered match was reused.")
+_metrics.describe("spine_match_cache_misses_total", "counter", "Spine files that had to be matched again.")
+_metrics.describe("spine_scan_duration_seconds", "histogram", "Time to scan and match the whole spines folder.")
+_metrics.describe("spine_scan_files", "gauge", "Spine image files seen by the last full scan.")
+_metrics.describe("spine_scan_unmatched", "gauge", "Spine image files the last full scan couldn't match.")
+_metrics.describe("spine_spines", "gauge", "Books with a spine in the current snapshot.")
+_metrics.describe("spine_index_load_duration_seconds", "gauge",
+                  "How long the book index last took to load, by source (snapshot or abs).")
+_metrics.describe("spine_index_books", "gauge", "Books in the title matching index.")
+_metrics.describe("spine_index_keys", "gauge", "Matchable keys in the title matching index.")
+_metrics.describe("spine_abs_request_duration_seconds", "histogram", "Time for one ABS API request, by endpoint.")
+_metrics.describe("spine_abs_errors_total", "counter", "ABS API requests that failed, by endpoint.")
+_metrics.describe("spine_stale_files_total", "counter", "Spine files found changed or gone since the last scan.")
+
+# Path segments with digits in them are IDs; they're dropped from ABS
+# endpoint labels so each endpoint is one time series
+_ABS_ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+
+def abs_endpoint_label(endpoint):
+    return _ABS_ID_SEGMENT.sub("/{id}", endpoint.split("?")[0])
+
+
+# =============================================================================
+# PROFILING
+# =============================================================================
+
+# How many of the slowest filename matches a --profile report lists
+PROFILE_SLOWEST = 10
+
+PROFILE_REPORT_FILENAME = "profile-report.json"
+
+
+class PhaseTimer:
+    """
+    Wall-clock time spent in each phase of loading and matching
+    (get_all_books, build_title_index, normalize, the fuzzy step of
+    match_filename_to_book, ...), plus the slowest individual matches.
+
+    Off unless --profile is given; while off, every hook is a single
+    attribute check. Phases nest: time spent in normalize() is also
+    counted in the phase that called it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._totals = {}    # phase → [seconds, calls]
+        self._slowest = []   # min-heap of (seconds, filename, match_type)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            entry = self._totals.get(name)
+            if entry is None:
+                entry = self._totals[name] = [0.0, 0]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def phase(self, name):
+        """Context manager timing a block as one call of `name`."""
+        return _TimedPhase(self, name) if self.enabled else _NO_PHASE
+
+    def note_match(self, filename, seconds, match_type):
+        """Record how long one filename took to match."""
+        self.add("match_filename_to_book", seconds)
+        with self._lock:
+            item = (seconds, filename, match_type or "unmatched")
+            if len(self._slowest) < PROFILE_SLOWEST:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def take(self, label, wall):
+        """The phases recorded since the last take(), as a report dict; resets the counters."""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+            slowest, self._slowest = self._slowest, []
+        return {
+            "label": label,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": round(wall, 6),
+            "phases": {
+                name: {"seconds": round(seconds, 6), "calls": calls}
+                for name, (seconds, calls) in sorted(totals.items(), key=lambda x: -x[1][0])
+            },
+            "slowest_matches": [
+                {"file": filename, "seconds": round(seconds, 6), "match": match_type}
+                for seconds, filename, match_type in sorted(slowest, reverse=True)
+            ],
+        }
+
+
+class _TimedPhase:
+    __slots__ = ("timer", "name", "started")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+_phases = PhaseTimer()
+_profile_reports = {}  # label → last report, as written to PROFILE_REPORT_FILENAME
+
+
+def report_profile(label, wall):
+    """
+    Print the phases recorded since the last report and save them to the
+    cache folder (the latest report of each kind is kept).
+    """
+    report = _phases.take(label, wall)
+    phases = report["phases"]
+    slowest = report["slowest_matches"]
+
+    print(f"Profile ({label}): {wall:.3f}s wall")
+    if phases:
+        print(f"  {'phase':<26} {'total':>10} {'calls':>9} {'per call':>10}")
+        for name, entry in phases.items():
+            per_call = entry["seconds"] / entry["calls"] * 1000
+            print(f"  {name:<26} {entry['seconds']:>9.3f}s {entry['calls']:>9} {per_call:>8.3f}ms")
+    if slowest:
+        print("  Slowest matches:")
+        for item in slowest:
+            print(f"    {item['seconds'] * 1000:>9.2f}ms  {item['file']}  ({item['match']})")
+
+    _profile_reports[label] = report
+    try:
+        write_json_atomic(cache_path(PROFILE_REPORT_FILENAME), _profile_reports)
+    except OSError as e:
+        print(f"Could not save profile report: {e}")
+
 
 # =============================================================================
 # ABS API HELPERS
 # =============================================================================
 
+# Items per request when paging through a library. Small enough that no
+# single response balloons memory, big enough to keep round trips few.
+ABS_PAGE_SIZE = 500
+
+# Parallel requests to ABS while fetching the catalog
+ABS_FETCH_WORKERS = 4
+
+# Seconds between asking ABS for books added, changed or removed (0 = never)
+SYNC_INTERVAL = 300
+
+# Seconds between catalog syncs that compare every library's full ID list
+# with ours, for deletions the incremental sync can't see
+CATALOG_RECONCILE_INTERVAL = 3600
+
+_abs_local = threading.local()  # each thread's keep-alive connection to ABS
+_abs_pool = None
+_abs_pool_lock = threading.Lock()
+
+
+def _abs_connection():
+    """This thread's connection to ABS, opened on first use and then reused."""
+    conn = getattr(_abs_local, "conn", None)
+    if conn is None:
+        parts = urllib.parse.urlsplit(ABS_URL)
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=30)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        _abs_local.conn = conn
+    return conn
+
+
+def _drop_abs_connection():
+    conn = getattr(_abs_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _abs_local.conn = None
+
+
 def abs_api_get(endpoint):
-    """Make a GET request to the ABS API. Returns parsed JSON or None on error."""
+    """
+    Make a GET request to the ABS API. Returns parsed JSON or None on error.
+
+    Requests go over a keep-alive connection per thread and ask for gzip.
+    The whole body is read and decompressed before it is parsed, so callers
+    page through large listings to keep each response small.
+    """
     if not ABS_API_KEY:
         print("ERROR: No ABS_API_KEY set. Get one from ABS > Settings > API Tokens")
         print("       Set it with: export ABS_API_KEY='your-key-here'")
         sys.exit(1)
 
-    url = f"{ABS_URL.rstrip('/')}{endpoint}"
-    req = urllib.request.Request(url)
-    req.add_header("Authorization", f"Bearer {ABS_API_KEY}")
+    path = urllib.parse.urlsplit(ABS_URL).path.rstrip("/") + endpoint
+    headers = {
+        "Authorization": f"Bearer {ABS_API_KEY}",
+        "Accept-Encoding": "gzip",
+    }
 
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read().decode())
-    except urllib.error.HTTPError as e:
-        print(f"API error {e.code}: {e.reason}")
-        if e.code == 401:
-            print("  -> Your API key is invalid. Check ABS > Settings > API Tokens")
-        return None
-    except urllib.error.URLError as e:
-        print(f"Cannot reach ABS at {ABS_URL}: {e.reason}")
+    # A reused connection may have been closed by ABS while idle; that
+    # surfaces as a disconnect on the first try and deserves one retry.
+    label = abs_endpoint_label(endpoint)
+    started = time.perf_counter()
+    for attempt in (1, 2):
+        reused = getattr(_abs_local, "conn", None) is not None
+        conn = _abs_connection()
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            if resp.status >= 400:
+                resp.read()
+                _metrics.inc("spine_abs_errors_total", endpoint=label)
+                print(f"API error {resp.status}: {resp.reason}")
+                if resp.status == 401:
+                    print("  -> Your API key is invalid. Check ABS > Settings > API Tokens")
+                return None
+            if resp.getheader("Content-Encoding") == "gzip":
+                with gzip.GzipFile(fileobj=resp) as body:
+                    data = json.load(body)
+            else:
+                data = json.load(resp)
+            _metrics.observe("spine_abs_request_duration_seconds", time.perf_counter() - started, endpoint=label)
+            return data
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            _drop_abs_connection()
+            if reused and attempt == 1:
+                continue
+            error = e
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            _drop_abs_connection()
+            error = e
+        _metrics.inc("spine_abs_errors_total", endpoint=label)
+        print(f"Cannot reach ABS at {ABS_URL}: {error}")
         print("  -> Is ABS running? Is the URL correct?")
         return None
 
 
+def _abs_executor():
+    """Shared worker threads for ABS requests. They live on, so their connections stay warm."""
+    global _abs_pool
+    with _abs_pool_lock:
+        if _abs_pool is None:
+            _abs_pool = ThreadPoolExecutor(max_workers=ABS_FETCH_WORKERS, thread_name_prefix="abs-fetch")
+        return _abs_pool
+
+
 def get_all_libraries():
     """Get list of all libraries from ABS."""
     data = abs_api_get("/api/libraries")
@@ -110,44 +567,119 @@ def get_all_libraries():
     return data.get("libraries", [])
 
 
-def get_library_items(library_id):
-    """Get all items from a library."""
-    data = abs_api_get(f"/api/libraries/{library_id}/items?limit=100000")
-    if not data:
-        return []
-    return data.get("results", [])
+def book_from_item(item, lib_id, lib_name):
+    """Keep just the fields of an ABS library item that this server uses."""
+    metadata = item.get("media", {}).get("metadata", {})
+    return {
+        "id": item["id"],
+        "title": metadata.get("title", "Unknown"),
+        "author": metadata.get("authorName", "Unknown"),
+        "path": item.get("path", ""),
+        "libraryId": lib_id,
+        "libraryName": lib_name,
+        "updatedAt": item.get("updatedAt", 0),
+    }
 
 
-def get_all_books():
+def get_library_page(lib_id, lib_name, page):
+    """
+    Fetch one page of a library's items, already trimmed to book dicts.
+    Returns (total_items_in_library, books), or None on error.
+    """
+    data = abs_api_get(
+        f"/api/libraries/{lib_id}/items?limit={ABS_PAGE_SIZE}&page={page}&minified=1&sort=addedAt"
+    )
+    if data is None:
+        return None
+    books = [book_from_item(item, lib_id, lib_name) for item in data.get("results", [])]
+    return data.get("total", len(books)), books
+
+
+def get_library_changes(lib_id, lib_name, since):
+    """
+    Fetch the items of a library updated at or after `since` (ABS
+    timestamp, ms), newest first, stopping at the first older item.
+    Returns (total_items_in_library, books), or None on error.
+
+    Stopping early is only safe if ABS really sorted the listing. If an
+    item is newer than the one before it, books comes back as None and
+    the caller has to fetch the library in full.
+    """
+    books = []
+    page = 0
+    previous = None
+    while True:
+        data = abs_api_get(
+            f"/api/libraries/{lib_id}/items?limit={ABS_PAGE_SIZE}&page={page}"
+            f"&minified=1&sort=updatedAt&desc=1"
+        )
+        if data is None:
+            return None
+        results = data.get("results", [])
+        for item in results:
+            updated = item.get("updatedAt", 0)
+            if previous is not None and updated > previous:
+                return data.get("total", 0), None
+            previous = updated
+            if updated < since:
+                return data.get("total", 0), books
+            books.append(book_from_item(item, lib_id, lib_name))
+        if len(results) < ABS_PAGE_SIZE:
+            return data.get("total", 0), books
+        page += 1
+
+
+def get_library_books(library_id, library_name=None):
+    """Get all books in one library, as book dicts (see get_all_books)."""
+    return get_all_books([{"id": library_id, "name": library_name or library_id}])
+
+
+def get_all_books(libraries=None):
     """
     Get ALL books from ALL libraries.
     Returns a list of dicts: [{id, title, author, path, libraryId}, ...]
+
+    Libraries are paged through ABS_PAGE_SIZE items at a time. The first
+    page of every library is requested at once, then the remaining pages
+    once each library's total is known. Results keep library and page
+    order, so the title index comes out the same on every run.
     """
     books = []
-    libraries = get_all_libraries()
+    if libraries is None:
+        libraries = get_all_libraries()
 
     if not libraries:
         print("No libraries found. Is ABS set up?")
         return books
 
-    for lib in libraries:
-        lib_id = lib["id"]
-        lib_name = lib.get("name", lib_id)
-        items = get_library_items(lib_id)
-
-        for item in items:
-            media = item.get("media", {})
-            metadata = media.get("metadata", {})
-
-            book = {
-                "id": item["id"],
-                "title": metadata.get("title", "Unknown"),
-                "author": metadata.get("authorName", "Unknown"),
-                "path": item.get("path", ""),
-                "libraryId": lib_id,
-                "libraryName": lib_name,
-            }
-            books.append(book)
+    pool = _abs_executor()
+    first_pages = [
+        (lib, pool.submit(get_library_page, lib["id"], lib.get("name", lib["id"]), 0))
+        for lib in libraries
+    ]
+
+    # As each first page lands, queue up the rest of that library
+    plans = []
+    for lib, future in first_pages:
+        lib_name = lib.get("name", lib["id"])
+        result = future.result()
+        if result is None:
+            print(f"WARNING: Could not fetch library {lib_name}")
+            continue
+        total, first_books = result
+        pages = (total + ABS_PAGE_SIZE - 1) // ABS_PAGE_SIZE
+        rest = [pool.submit(get_library_page, lib["id"], lib_name, page) for page in range(1, pages)]
+        plans.append((lib_name, first_books, rest))
+
+    for lib_name, first_books, rest in plans:
+        books.extend(first_books)
+        for page, future in enumerate(rest, start=1):
+            result = future.result()
+            if result is None:
+                print(f"WARNING: Page {page} of library {lib_name} failed; "
+                      f"some books will be missing until the next fetch")
+                continue
+            books.extend(result[1])
 
     return books
 
@@ -165,6 +697,7 @@ def normalize(text):
     "The_Great_Gatsby"                     → "the great gatsby"
     "Ender\u2019s Game"                    → "enders game"
     """
+    started = time.perf_counter() if _phases.enabled else None
     # Unicode normalize (curly quotes → straight, accents → base)
     text = unicodedata.normalize("NFKD", text)
     # Lowercase
@@ -175,29 +708,58 @@ def normalize(text):
     text = re.sub(r"[^\w\s]", "", text)
     # Collapse whitespace
     text = re.sub(r"\s+", " ", text).strip()
+    if started is not None:
+        _phases.add("normalize", time.perf_counter() - started)
     return text
 
 
-def build_title_index(books):
+def title_keys(book):
     """
-    Build lookup tables for matching filenames to books.
-
-    Returns a dict of normalized_string → book_id.
-    Multiple keys can point to the same book to increase match chances.
-
-    For each book we index:
+    The normalized keys a book can be matched by:
       - title                        ("dune")
       - author - title               ("frank herbert dune")
       - title - author               ("dune frank herbert")
       - title without leading "the"  ("hobbit" for "The Hobbit")
       - title without subtitle       ("dune" for "Dune: Part One")
     """
+    title = book["title"]
+    nt = normalize(title)
+    na = normalize(book["author"])
+
+    # Title alone
+    keys = [nt]
+
+    # Author - Title  and  Title - Author
+    if na and na != "unknown":
+        keys.append(f"{na} {nt}")
+        keys.append(f"{nt} {na}")
+
+    # Without leading article
+    for article in ("the ", "a ", "an "):
+        if nt.startswith(article):
+            keys.append(nt[len(article):])
+            break
+
+    # Without subtitle (split on colon or dash-surrounded-by-spaces)
+    for sep in [":", " - "]:
+        if sep in title:
+            keys.append(normalize(title.split(sep)[0]))
+
+    return [key for key in keys if key]
+
+
+def build_title_index(books):
+    """
+    Build lookup tables for matching filenames to books.
+
+    Returns a dict of normalized_string → book_id.
+    Multiple keys can point to the same book to increase match chances;
+    see title_keys() for what gets indexed.
+    """
     index = {}
     collisions = {}  # track normalized keys that map to multiple books
 
-    def add(key, book_id, description):
-        if not key:
-            return
+    def add(key, book_id):
         if key in index and index[key] != book_id:
             # Collision — two books normalize to the same key. Mark as ambiguous.
             collisions[key] = collisions.get(key, [index[key]])
@@ -206,31 +768,8 @@ def build_title_index(books):
         index[key] = book_id
 
     for book in books:
-        bid = book["id"]
-        title = book["title"]
-        author = book["author"]
-        nt = normalize(title)
-        na = normalize(author)
-
-        # Title alone
-        add(nt, bid, "title")
-
-        # Author - Title  and  Title - Author
-        if na and na != "unknown":
-            add(f"{na} {nt}", bid, "author title")
-            add(f"{nt} {na}", bid, "title author")
-
-        # Without leading article
-        for article in ("the ", "a ", "an "):
-            if nt.startswith(article):
-                add(nt[len(article):], bid, "title without article")
-                break
-
-        # Without subtitle (split on colon or dash-surrounded-by-spaces)
-        for sep in [":", " - "]:
-            if sep in title:
-                base = normalize(title.split(sep)[0])
-                add(base, bid, "title without subtitle")
+        for key in title_keys(book):
+            add(key, book["id"])
 
     # Remove ambiguous keys
     for key in collisions:
@@ -240,7 +779,242 @@ def build_title_index(books):
     return index, collisions
 
 
-def match_filename_to_book(filename, title_index):
+# Containment matches need at least this many characters on the shorter
+# side, otherwise "it" would match half the library
+FUZZY_MIN_LENGTH = 5
+
+# Discarded keys stay in a FuzzyIndex as tombstones. Once there are more of
+# them than live keys (and at least this many), the index is rebuilt
+FUZZY_COMPACT_MIN = 1000
+
+
+# Most typos a filename may have and still match a title key. Short names
+# get less slack: "Dune" with one typo could just as well be another book.
+TYPO_MAX_DISTANCE = 2
+
+
+def typo_allowance(nf):
+    """How many typos to forgive in a normalized filename of this length."""
+    return min(TYPO_MAX_DISTANCE, len(nf) // 6)
+
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance between two strings.
+
+    Uses the bit-parallel algorithm (Myers/Hyyrö): one column of the DP
+    table lives in the bits of an int, so the cost is one pass over `a`
+    rather than len(a) × len(b) Python steps.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(b)
+    if m == 0:
+        return len(a)
+
+    peq = {}
+    for i, ch in enumerate(b):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for ch in a:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv & full
+    return score
+
+
+class FuzzyIndex:
+    """
+    Answers the loose steps of match_filename_to_book without looking at
+    every key in the title index.
+
+    Containment ("is the filename inside a title key, or a title key inside
+    the filename?") uses two lookups, one per direction:
+      - Key inside filename: keys are filed under their first few
+        characters, so only keys starting at some position of the
+        filename are checked.
+      - Filename inside key: every key is listed under each of its
+        trigrams. Candidates come from the filename's rarest trigram
+        and are confirmed with a real substring test.
+
+    Each key remembers the order it was added in. Ties are broken by that
+    order, exactly like the linear scan over the title_index dict did, so
+    both paths pick the same winner.
+
+    Typos reuse the trigram lists; see closest().
+    """
+
+    def __init__(self, title_index=None):
+        self._entries = []     # rank → (key, book_id), or None once discarded
+        self._ranks = {}       # key → rank
+        self._by_prefix = {}   # first FUZZY_MIN_LENGTH chars → [rank, ...]
+        self._by_trigram = {}  # trigram → array of ranks, ascending
+        for key, book_id in (title_index or {}).items():
+            self.add(key, book_id)
+
+    def __len__(self):
+        return len(self._ranks)
+
+    def add(self, key, book_id):
+        """Index a title key. Re-adding a key moves it to the end of the tie-break order."""
+        if len(key) < FUZZY_MIN_LENGTH:
+            return
+        self.discard(key)
+        rank = len(self._entries)
+        self._entries.append((key, book_id))
+        self._ranks[key] = rank
+        self._by_prefix.setdefault(key[:FUZZY_MIN_LENGTH], []).append(rank)
+        for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+            postings = self._by_trigram.get(gram)
+            if postings is None:
+                postings = self._by_trigram[gram] = array("I")
+            postings.append(rank)
+
+    def discard(self, key):
+        """Stop matching a title key (e.g. it became ambiguous)."""
+        rank = self._ranks.pop(key, None)
+        if rank is not None:
+            self._entries[rank] = None
+
+    def wasteful(self):
+        """True when tombstones outnumber live keys and compacted() would pay off."""
+        dead = len(self._entries) - len(self._ranks)
+        return dead >= FUZZY_COMPACT_MIN and dead > len(self._ranks)
+
+    def compacted(self):
+        """
+        A new index holding only the live keys, in the same tie-break
+        order. Built as a copy so lookups running on the old one stay
+        consistent.
+        """
+        fresh = FuzzyIndex()
+        for entry in self._entries:
+            if entry is not None:
+                fresh.add(*entry)
+        return fresh
+
+    def best_match(self, nf):
+        """
+        Find the tightest containment match for a normalized filename.
+        Returns a book ID or None.
+        """
+        if len(nf) < FUZZY_MIN_LENGTH:
+            return None
+
+        entries = self._entries
+        best_len, best_rank, best_id = 0, None, None
+
+        # Filename inside a key: the overlap is the whole filename. Postings
+        # are in rank order, so the first confirmed hit is the tie winner.
+        postings = None
+        for gram in {nf[i:i + 3] for i in range(len(nf) - 2)}:
+            candidates = self._by_trigram.get(gram)
+            if candidates is None:
+                postings = None
+                break
+            if postings is None or len(candidates) < len(postings):
+                postings = candidates
+        for rank in postings or ():
+            entry = entries[rank]
+            if entry is not None and nf in entry[0]:
+                best_len, best_rank, best_id = len(nf), rank, entry[1]
+                break
+
+        # Key inside the filename: the overlap is the key's length
+        prefixes = self._by_prefix
+        for start in range(len(nf) - FUZZY_MIN_LENGTH + 1):
+            for rank in prefixes.get(nf[start:start + FUZZY_MIN_LENGTH], ()):
+                entry = entries[rank]
+                if entry is None or not nf.startswith(entry[0], start):
+                    continue
+                overlap = len(entry[0])
+                if overlap > best_len or (overlap == best_len and rank < best_rank):
+                    best_len, best_rank, best_id = overlap, rank, entry[1]
+
+        return best_id
+
+    def _rarest(self, text):
+        """Posting list of the least common trigram in `text` (empty if one is unknown)."""
+        rarest = None
+        for i in range(len(text) - 2):
+            postings = self._by_trigram.get(text[i:i + 3])
+            if postings is None:
+                return ()
+            if rarest is None or len(postings) < len(rarest):
+                rarest = postings
+        return rarest or ()
+
+    def closest(self, nf, max_distance):
+        """
+        Find the key nearest to a normalized filename within max_distance
+        edits. Returns (book_id, distance), or (None, None) if nothing is
+        close enough or the nearest keys belong to different books.
+
+        Pigeonhole filter: cut the filename into max_distance + 1 pieces.
+        Each edit can spoil at most one piece, so any key within range
+        contains at least one piece unchanged. Only keys holding a piece
+        (found via its rarest trigram) and of a plausible length get a real
+        edit-distance check.
+        """
+        if max_distance <= 0 or len(nf) < 3 * (max_distance + 1):
+            return None, None
+
+        entries = self._entries
+        pieces = max_distance + 1
+        step = len(nf) / pieces
+        checked = set()
+        best_distance, best_ids = None, set()
+
+        for p in range(pieces):
+            piece = nf[int(p * step):int((p + 1) * step)]
+            for rank in self._rarest(piece):
+                entry = entries[rank]
+                if entry is None or rank in checked:
+                    continue
+                key, book_id = entry
+                if abs(len(key) - len(nf)) > max_distance or piece not in key:
+                    continue
+                checked.add(rank)
+                distance = edit_distance(nf, key)
+                if distance > max_distance:
+                    continue
+                if best_distance is None or distance < best_distance:
+                    best_distance, best_ids = distance, {book_id}
+                elif distance == best_distance:
+                    best_ids.add(book_id)
+
+        if len(best_ids) != 1:
+            return None, None
+        return best_ids.pop(), best_distance
+
+
+def match_tokens(text):
+    """
+    The words and trigrams of a normalized string. A filename can only
+    match a title key (by any rule in match_filename_to_book) if the two
+    share at least one: containment and typo matches share trigrams, and
+    exact and split matches share whole words, which catches keys too short
+    to have a trigram.
+    """
+    tokens = set(text.split())
+    tokens.update(text[i:i + 3] for i in range(len(text) - 2))
+    return tokens
+
+
+def match_filename_to_book(filename, title_index, fuzzy_index=None):
     """
     Try to match a filename (without extension) to a book ID.
 
@@ -249,8 +1023,13 @@ def match_filename_to_book(filename, title_index):
       2. Exact normalized match
       3. "Author - Title" split on " - "
       4. Partial match (filename contained in a title key, or vice versa)
+      5. Typo match (a key within a couple of edits), if fuzzy_index is given
+
+    Pass a FuzzyIndex built from the same title_index to make step 4 a
+    lookup instead of a scan over every key, and to enable step 5.
 
-    Returns (book_id, match_type) or (None, None).
+    Returns (book_id, match_type) or (None, None). Typo matches report the
+    number of edits, e.g. "typo-1".
     """
     # 1. Already a book ID
     if filename.startswith("li_"):
@@ -281,21 +1060,33 @@ def match_filename_to_book(filename, title_index):
 
     # 4. Containment — filename is a substring of a key or vice versa
     #    Only if the shorter side is at least 5 chars (avoid false positives)
-    best_match = None
-    best_len = 0
-    for key, book_id in title_index.items():
-        if len(key) < 5 or len(nf) < 5:
-            continue
-        if nf in key or key in nf:
-            # Prefer the tighter match (less leftover)
-            overlap = min(len(nf), len(key))
-            if overlap > best_len:
-                best_len = overlap
-                best_match = book_id
+    started = time.perf_counter() if _phases.enabled else None
+    if fuzzy_index is not None:
+        best_match = fuzzy_index.best_match(nf)
+    else:
+        best_match = None
+        best_len = 0
+        for key, book_id in title_index.items():
+            if len(key) < FUZZY_MIN_LENGTH or len(nf) < FUZZY_MIN_LENGTH:
+                continue
+            if nf in key or key in nf:
+                # Prefer the tighter match (less leftover)
+                overlap = min(len(nf), len(key))
+                if overlap > best_len:
+                    best_len = overlap
+                    best_match = book_id
+
+    # 5. Typos — "Hitchikers Guide to the Galaxy" → "hitchhikers guide to the galaxy"
+    typo_match, distance = None, None
+    if not best_match and fuzzy_index is not None:
+        typo_match, distance = fuzzy_index.closest(nf, typo_allowance(nf))
+    if started is not None:
+        _phases.add("fuzzy", time.perf_counter() - started)
 
     if best_match:
         return best_match, "fuzzy"
-
+    if typo_match:
+        return typo_match, f"typo-{distance}"
     return None, None
 
 
@@ -308,35 +1099,202 @@ _title_index = {}
 _books_by_id = {}  # id → {title, author, ...} for logging
 _index_loaded = False
 _collisions = {}
+_fuzzy_index = FuzzyIndex()
+_index_fingerprint = ""
+_index_updated = None  # when the installed index was fetched from ABS
+_index_lock = threading.Lock()
+_key_owners = None  # key → set of book IDs, built on the first patch_book_index()
 
+BOOK_INDEX_FILENAME = "book-index.json.gz"
 
-def load_book_index():
+# Bump when match_filename_to_book changes behavior, so cached decisions
+# made by the old rules are thrown away
+MATCH_RULES_VERSION = 1
+
+
+def title_index_fingerprint(title_index):
     """
-    Fetch books from ABS and build the title matching index.
-    Called once on startup. If ABS is unreachable, falls back to ID-only mode.
+    A short hash identifying the exact set of title keys. Cached match
+    decisions are only trusted while this stays the same.
     """
-    global _title_index, _books_by_id, _index_loaded, _collisions
+    h = hashlib.sha1(f"rules:{MATCH_RULES_VERSION}\n".encode())
+    for key, book_id in sorted(title_index.items()):
+        h.update(f"{key}\t{book_id}\n".encode())
+    return h.hexdigest()
 
-    if not ABS_API_KEY:
-        print("No ABS_API_KEY set — running in ID-only mode.")
-        print("  Files must be named by book ID (e.g. li_abc123.png)")
-        print("  Set ABS_API_KEY to enable auto-matching by title.")
-        _index_loaded = True
-        return
 
-    print("Connecting to ABS to build book index...")
-    books = get_all_books()
+def install_book_index(books_by_id, title_index, collisions, updated=None):
+    """
+    Swap in a new book index. The fuzzy index and fingerprint are built
+    first, then everything is replaced together, so a scan running on
+    another thread sees either the old index or the new one.
+    """
+    global _title_index, _books_by_id, _collisions, _fuzzy_index, _index_fingerprint, _index_updated
+    global _key_owners
+
+    with _phases.phase("install_book_index"):
+        fuzzy_index = FuzzyIndex(title_index)
+        fingerprint = title_index_fingerprint(title_index)
+    with _index_lock:
+        _title_index = title_index
+        _books_by_id = books_by_id
+        _collisions = collisions
+        _fuzzy_index = fuzzy_index
+        _index_fingerprint = fingerprint
+        _index_updated = updated or time.time()
+        _key_owners = None
+
+
+def patch_book_index(upserts, removed_ids):
+    """
+    Apply catalog changes to the installed index in place, instead of
+    rebuilding it: add or replace the books in `upserts`, drop the IDs in
+    `removed_ids`, and update only the title keys those books own.
+
+    A key stays matchable while exactly one book owns it, and moves to the
+    collision list when a second book claims it (same rule as
+    build_title_index).
+
+    Returns the set of book IDs whose matching may have changed: the
+    books themselves, plus any book that gained or lost a key because of
+    them.
+    """
+    global _index_fingerprint, _index_updated, _key_owners, _fuzzy_index
+
+    with _index_lock:
+        owners = _key_owners
+        if owners is None:
+            owners = {}
+            for book in _books_by_id.values():
+                for key in title_keys(book):
+                    owners.setdefault(key, set()).add(book["id"])
+
+        touched = set()
+        changed = set()
+        for book_id in set(removed_ids) | {b["id"] for b in upserts}:
+            old = _books_by_id.pop(book_id, None)
+            if old is None:
+                continue
+            changed.add(book_id)
+            for key in title_keys(old):
+                owners[key].discard(book_id)
+                touched.add(key)
+
+        for book in upserts:
+            _books_by_id[book["id"]] = book
+            changed.add(book["id"])
+            for key in title_keys(book):
+                owners.setdefault(key, set()).add(book["id"])
+                touched.add(key)
+
+        for key in touched:
+            before = _title_index.get(key)
+            ids = owners.get(key)
+            if not ids:
+                owners.pop(key, None)
+                _title_index.pop(key, None)
+                _collisions.pop(key, None)
+                _fuzzy_index.discard(key)
+            elif len(ids) == 1:
+                (book_id,) = ids
+                _collisions.pop(key, None)
+                if before != book_id:
+                    _title_index[key] = book_id
+                    _fuzzy_index.add(key, book_id)
+            else:
+                _collisions[key] = sorted(ids)
+                _title_index.pop(key, None)
+                _fuzzy_index.discard(key)
+            after = _title_index.get(key)
+            if before != after:
+                changed.update(b for b in (before, after) if b)
+
+        # Discards leave tombstones in the entry list and trigram postings
+        if _fuzzy_index.wasteful():
+            _fuzzy_index = _fuzzy_index.compacted()
+
+        _key_owners = owners
+        _index_fingerprint = title_index_fingerprint(_title_index)
+        _index_updated = time.time()
+
+    return changed
+
+
+def matching_index():
+    """The (title_index, fuzzy_index, fingerprint) currently used for matching."""
+    with _index_lock:
+        return _title_index, _fuzzy_index, _index_fingerprint
 
+
+def save_book_index_snapshot():
+    """
+    Save the current index to the cache folder, so the next start can
+    serve immediately instead of waiting for ABS.
+    """
+    with _index_lock:
+        data = {
+            "version": 1,
+            "updated": _index_updated,
+            "books": list(_books_by_id.values()),
+            "title_index": _title_index,
+            "collisions": _collisions,
+        }
+    path = cache_path(BOOK_INDEX_FILENAME)
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with gzip.open(tmp, "wt", compresslevel=6) as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save book index snapshot: {e}")
+
+
+def load_book_index_snapshot():
+    """Install the saved index, if there is one. Returns True on success."""
+    started = time.perf_counter()
+    try:
+        with _phases.phase("load_index_snapshot"), gzip.open(cache_path(BOOK_INDEX_FILENAME), "rt") as f:
+            data = json.load(f)
+        if data.get("version") != 1:
+            return False
+        books_by_id = {b["id"]: b for b in data["books"]}
+        install_book_index(books_by_id, data["title_index"], data["collisions"], data["updated"])
+    except (OSError, ValueError, KeyError, TypeError, EOFError):
+        return False
+    _metrics.set("spine_index_load_duration_seconds", time.perf_counter() - started, source="snapshot")
+    return True
+
+
+def fetch_book_index():
+    """
+    Fetch books from ABS, install a fresh index and save a snapshot of it.
+    Returns the number of books, or 0 if ABS couldn't be reached.
+    """
+    started = time.perf_counter()
+    with _phases.phase("get_all_books"):
+        books = get_all_books()
     if not books:
-        print("WARNING: Could not load books from ABS. Running in ID-only mode.")
-        _index_loaded = True
-        return
+        return 0
 
-    _title_index, _collisions = build_title_index(books)
-    _books_by_id = {b["id"]: b for b in books}
-    _index_loaded = True
+    with _phases.phase("build_title_index"):
+        title_index, collisions = build_title_index(books)
+    install_book_index({b["id"]: b for b in books}, title_index, collisions)
+    _metrics.set("spine_index_load_duration_seconds", time.perf_counter() - started, source="abs")
+    save_book_index_snapshot()
+    return len(books)
 
-    print(f"Indexed {len(books)} books ({len(_title_index)} matchable keys)")
+
+def index_summary():
+    """Size and age of the installed book index, as shown by /health."""
+    return {
+        "indexed_books": len(_books_by_id),
+        "matchable_keys": len(_title_index),
+        "index_updated": datetime.fromtimestamp(_index_updated).isoformat() if _index_updated else None,
+    }
+
+
+def print_index_summary():
+    print(f"Indexed {len(_books_by_id)} books ({len(_title_index)} matchable keys)")
 
     if _collisions:
         print(f"  {len(_collisions)} ambiguous titles (skipped, use book IDs for these):")
@@ -347,53 +1305,486 @@ def load_book_index():
             print(f"    ... and {len(_collisions) - 5} more")
 
 
+def load_book_index(on_refresh=None, refresh_in_background=True):
+    """
+    Fetch books from ABS and build the title matching index.
+    Called once on startup. If ABS is unreachable, falls back to ID-only mode.
+
+    If a snapshot from a previous run exists, it's installed right away and
+    ABS is fetched on a background thread instead; `on_refresh` is called
+    once the fresh index has been swapped in. Pass
+    refresh_in_background=False when a CatalogSync will bring the snapshot
+    up to date instead.
+
+    Returns True if the index came from a snapshot.
+    """
+    global _index_loaded
+
+    if not ABS_API_KEY:
+        print("No ABS_API_KEY set — running in ID-only mode.")
+        print("  Files must be named by book ID (e.g. li_abc123.png)")
+        print("  Set ABS_API_KEY to enable auto-matching by title.")
+        _index_loaded = True
+        return False
+
+    if load_book_index_snapshot():
+        _index_loaded = True
+        age = datetime.fromtimestamp(_index_updated).strftime("%Y-%m-%d %H:%M")
+        print(f"Loaded book index snapshot from {age}; updating from ABS in the background.")
+        print_index_summary()
+        if not refresh_in_background:
+            return True
+
+        def refresh():
+            count = fetch_book_index()
+            if not count:
+                print("WARNING: Could not refresh books from ABS. Keeping the saved index.")
+                return
+            print(f"Book index refreshed from ABS ({count} books)")
+            if on_refresh:
+                on_refresh()
+
+        threading.Thread(target=refresh, name="book-index-refresh", daemon=True).start()
+        return True
+
+    print("Connecting to ABS to build book index...")
+    count = fetch_book_index()
+    _index_loaded = True
+
+    if not count:
+        print("WARNING: Could not load books from ABS. Running in ID-only mode.")
+        return False
+
+    print_index_summary()
+    return False
+
+
 def ensure_spines_dir():
     """Create the spines folder if it doesn't exist."""
     os.makedirs(SPINES_DIR, exist_ok=True)
 
 
-def find_spine_files():
+_cache_folder = None  # (configured folder, folder actually used)
+
+
+def cache_folder():
     """
-    Scan the spines/ folder for image files.
-    Returns a dict: {book_id: file_path, ...}
+    The cache folder, created if needed. If it can't be created or written
+    to, warns once and uses a fresh temp folder instead, so the server
+    still starts but nothing is kept across restarts.
 
-    Files can be named:
-      - By book ID:    li_abc123.png         (always works)
-      - By title:      Dune.png              (matched via ABS)
-      - Author-title:  Frank Herbert - Dune.png
-      - Underscores:   The_Hobbit.png
+    Resolved once and remembered, so worker processes forked later share
+    the same folder.
     """
-    spines = {}
-    unmatched = []
+    global _cache_folder
 
-    if not os.path.isdir(SPINES_DIR):
-        return spines
+    configured = CACHE_DIR or os.path.join(SPINES_DIR, ".spine-cache")
+    if _cache_folder is not None and _cache_folder[0] == configured:
+        return _cache_folder[1]
 
-    for filename in os.listdir(SPINES_DIR):
-        filepath = os.path.join(SPINES_DIR, filename)
-        if not os.path.isfile(filepath):
-            continue
+    folder = configured
+    try:
+        os.makedirs(folder, exist_ok=True)
+        if not os.access(folder, os.W_OK):
+            raise PermissionError(errno.EACCES, "not writable", folder)
+    except OSError as e:
+        folder = tempfile.mkdtemp(prefix="spine-cache-")
+        print(f"WARNING: Cache folder unusable ({e}). Using {folder}, which is not kept across restarts.")
+    _cache_folder = (configured, folder)
+    return folder
 
-        name, ext = os.path.splitext(filename)
-        ext_lower = ext.lower()
 
-        if ext_lower not in (".png", ".jpg", ".jpeg", ".webp"):
-            continue
+def cache_path(name):
+    """Path of a file in the cache folder (see cache_folder)."""
+    return os.path.join(cache_folder(), name)
+
+
+def write_json_atomic(path, data):
+    """Write JSON via a temp file + rename, so readers never see half a file."""
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+# Match types no catalog change can improve on; any other decision may be
+# beaten by a book added later (see SpineRefresher.apply_catalog_changes)
+FIRM_MATCH_TYPES = ("id", "exact")
+
+
+class MatchCache:
+    """
+    Remembers which book each spine file matched, across restarts.
 
-        # Try to match this filename to a book
-        book_id, match_type = match_filename_to_book(name, _title_index)
+    A decision is reused only while the file's size and mtime and the
+    title index fingerprint are unchanged. Anything else (a new file, a
+    replaced image, a changed ABS catalog) gets matched for real. Files
+    that didn't match are remembered too; they're the expensive ones.
 
+    Stored as JSON in the cache folder:
+      {"fingerprint": "...", "entries": {filename: [size, mtime_ns, book_id, match_type]}}
+    """
+
+    FILENAME = "match-cache.json"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.fingerprint = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+    def load(self):
+        """Read the cache file if there is one. A missing or corrupt file just means an empty cache."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.fingerprint = data["fingerprint"]
+            self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.fingerprint, self.entries = None, {}
+        return self
+
+    def lookup(self, filename, st, fingerprint):
+        """Return a cached (book_id, match_type), or None if it has to be matched again."""
+        entry = self.entries.get(filename) if fingerprint == self.fingerprint else None
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            self.hits += 1
+            return entry[2], entry[3]
+        self.misses += 1
+        return None
+
+    def store(self, filename, st, fingerprint, book_id, match_type):
+        if fingerprint != self.fingerprint:
+            self.fingerprint, self.entries = fingerprint, {}
+        self.entries[filename] = [st.st_size, st.st_mtime_ns, book_id, match_type]
+        self._dirty = True
+
+    def forget(self, filename):
+        if self.entries.pop(filename, None) is not None:
+            self._dirty = True
+
+    def rebase(self, fingerprint):
+        """
+        Carry all entries over to a new title index fingerprint. Only for
+        when the caller knows which decisions the change could affect and
+        forgets those itself (see SpineRefresher.apply_catalog_changes).
+        """
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self._dirty = True
+
+    def retain(self, filenames):
+        """Drop entries for files that are no longer in the folder."""
+        for filename in set(self.entries) - set(filenames):
+            self.forget(filename)
+
+    def save(self):
+        if not self._dirty or not self.path:
+            return
+        try:
+            write_json_atomic(self.path, {"fingerprint": self.fingerprint, "entries": self.entries})
+            self._dirty = False
+        except OSError as e:
+            print(f"Could not save match cache: {e}")
+
+
+def image_dimensions(f):
+    """
+    (width, height) of a PNG, JPEG or WebP image, read from its headers
+    without decoding it; None if the format isn't recognised. `f` is a
+    binary file positioned at the start.
+    """
+    head = f.read(32)
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and head[20:21] == b"\x2f":
+            bits = struct.unpack("<I", head[21:25])[0]
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return width, height
+        return None
+
+    if head[:2] == b"\xff\xd8":
+        # Walk the segments until a start-of-frame marker, which holds the size
+        f.seek(2)
+        while True:
+            if f.read(1) != b"\xff":
+                return None
+            marker = f.read(1)
+            while marker == b"\xff":  # fill bytes
+                marker = f.read(1)
+            if not marker:
+                return None
+            code = marker[0]
+            if code == 0x01 or 0xD0 <= code <= 0xD9:
+                continue  # markers without a length
+            length = f.read(2)
+            if len(length) < 2:
+                return None
+            length = struct.unpack(">H", length)[0]
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                height, width = struct.unpack(">xHH", frame)
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+    return None
+
+
+class SpineInfoCache:
+    """
+    Content hash, byte size and pixel size of each spine file, for the
+    manifest. Entries are kept across restarts and reused while a file's
+    size and mtime are unchanged, so a rescan only reads files that are
+    new or were replaced.
+
+    Stored as JSON in the cache folder:
+      {"entries": {filename: [size, mtime_ns, sha256, width, height]}}
+    """
+
+    FILENAME = "spine-info.json"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+
+    def load(self):
+        """Read the cache file if there is one. A missing or corrupt file just means an empty cache."""
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+        return self
+
+    def describe(self, path, stamp):
+        """
+        {"sha256", "size", "width", "height"} for the file at `path`, whose
+        (size, mtime_ns) is `stamp`. None if it can't be read.
+        """
+        filename = os.path.basename(path)
+        entry = self.entries.get(filename)
+        if not entry or (entry[0], entry[1]) != tuple(stamp):
+            try:
+                with open(path, "rb") as f:
+                    try:
+                        dimensions = image_dimensions(f)
+                    except (OSError, struct.error, ValueError):
+                        dimensions = None
+                    f.seek(0)
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(65536), b""):
+                        digest.update(chunk)
+            except OSError:
+                return None
+            width, height = dimensions or (None, None)
+            entry = [stamp[0], stamp[1], digest.hexdigest(), width, height]
+            self.entries[filename] = entry
+            self._dirty = True
+        return {"sha256": entry[2], "size": entry[0], "width": entry[3], "height": entry[4]}
+
+    def retain(self, filenames):
+        """Drop entries for files that are no longer in the folder."""
+        for filename in set(self.entries) - set(filenames):
+            del self.entries[filename]
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty or not self.path:
+            return
+        try:
+            write_json_atomic(self.path, {"entries": self.entries})
+            self._dirty = False
+        except OSError as e:
+            print(f"Could not save spine info cache: {e}")
+
+
+SPINE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def is_spine_file(filename):
+    """True if a file in the spines folder looks like a spine image."""
+    return os.path.splitext(filename)[1].lower() in SPINE_EXTENSIONS
+
+
+class SpineMatches:
+    """
+    Match decisions for every image in the spines folder, plus the
+    book_id → file map derived from them.
+
+    Keeping the per-file decisions around means a single added, renamed or
+    removed file can be re-matched and patched in without redoing the rest
+    of the folder.
+    """
+
+    def __init__(self):
+        self.files = {}       # filename → (book_id or None, match_type)
+        self.stats = {}       # filename → (size, mtime_ns)
+        self.by_book = {}     # book_id → set of filenames matched to it
+        self.spines = {}      # book_id → path of the file being served
+        self.unmatched = set()
+
+    def match(self, filename, st=None, cache=None):
+        """
+        (Re-)match one file. Returns the set of book IDs whose spine changed.
+        With a MatchCache and the file's stat result, a remembered decision
+        is reused when nothing relevant changed.
+        """
+        title_index, fuzzy_index, fingerprint = matching_index()
+        decision = cache.lookup(filename, st, fingerprint) if cache else None
+        if decision is None:
+            name = os.path.splitext(filename)[0]
+            started = time.perf_counter() if _phases.enabled else None
+            decision = match_filename_to_book(name, title_index, fuzzy_index)
+            if started is not None:
+                _phases.note_match(filename, time.perf_counter() - started, decision[1])
+            if cache:
+                cache.store(filename, st, fingerprint, *decision)
+        changed = self.set(filename, *decision)
+        if st is not None:
+            self.stats[filename] = (st.st_size, st.st_mtime_ns)
+        return changed
+
+    def set(self, filename, book_id, match_type):
+        """Record a match decision for a file. Returns the set of book IDs whose spine changed."""
+        changed = self.remove(filename)
+        self.files[filename] = (book_id, match_type)
         if book_id:
-            if book_id in spines:
-                # Already have a spine for this book — prefer ID-named files
-                existing_name = os.path.basename(spines[book_id])
-                if match_type != "id" and existing_name.startswith("li_"):
-                    continue  # Keep the ID-named one
-            spines[book_id] = filepath
+            self.by_book.setdefault(book_id, set()).add(filename)
+            if self._elect(book_id):
+                changed.add(book_id)
+        else:
+            self.unmatched.add(filename)
+        return changed
+
+    def touch(self, filename, st):
+        """
+        Note new contents for an already-matched file. Returns the book ID
+        it serves (as a set) if its size or mtime changed, so the snapshot
+        gets republished.
+        """
+        stamp = (st.st_size, st.st_mtime_ns)
+        if self.stats.get(filename) == stamp:
+            return set()
+        self.stats[filename] = stamp
+        book_id = self.files.get(filename, (None,))[0]
+        if book_id and self.spines.get(book_id) == os.path.join(SPINES_DIR, filename):
+            return {book_id}
+        return set()
+
+    def served_stats(self):
+        """(size, mtime_ns) of every file being served, keyed by path."""
+        return {
+            path: self.stats.get(os.path.basename(path))
+            for path in self.spines.values()
+        }
+
+    def remove(self, filename):
+        """Forget a file. Returns the set of book IDs whose spine changed."""
+        self.stats.pop(filename, None)
+        changed = set()
+        decision = self.files.pop(filename, None)
+        if decision is None:
+            return changed
+        book_id = decision[0]
+        if not book_id:
+            self.unmatched.discard(filename)
+            return changed
+        names = self.by_book.get(book_id)
+        if names:
+            names.discard(filename)
+            if not names:
+                del self.by_book[book_id]
+        if self._elect(book_id):
+            changed.add(book_id)
+        return changed
+
+    def _elect(self, book_id):
+        """
+        Pick which file serves a book when several match it.
+        ID-named files win over title matches; ties go to the first name
+        alphabetically so the choice doesn't depend on listing order.
+        """
+        names = self.by_book.get(book_id)
+        if names:
+            winner = min(names, key=lambda n: (self.files[n][1] != "id", n))
+            path = os.path.join(SPINES_DIR, winner)
+        else:
+            path = None
+        if self.spines.get(book_id) == path:
+            return False
+        if path:
+            self.spines[book_id] = path
         else:
-            unmatched.append(filename)
+            del self.spines[book_id]
+        return True
+
+
+def stat_spine_file(filename):
+    """os.stat() a spines folder entry, or None if it isn't a regular spine image."""
+    if not is_spine_file(filename):
+        return None
+    try:
+        st = os.stat(os.path.join(SPINES_DIR, filename))
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def scan_spine_folder(cache=None):
+    """
+    Match every image in the spines folder. Returns a SpineMatches.
+    Pass a MatchCache to skip matching files that haven't changed.
+    """
+    matches = SpineMatches()
+
+    if not os.path.isdir(SPINES_DIR):
+        return matches
 
-    return spines, unmatched
+    started = time.perf_counter()
+    for filename in os.listdir(SPINES_DIR):
+        st = stat_spine_file(filename)
+        if st is not None:
+            matches.match(filename, st, cache)
+
+    if cache:
+        cache.retain(matches.files)
+        cache.save()
+    if _phases.enabled:
+        _phases.add("scan_spine_folder", time.perf_counter() - started)
+    _metrics.observe("spine_scan_duration_seconds", time.perf_counter() - started)
+    _metrics.set("spine_scan_files", len(matches.files))
+    _metrics.set("spine_scan_unmatched", len(matches.unmatched))
+    return matches
+
+
+def find_spine_files():
+    """
+    Scan the spines/ folder for image files.
+    Returns (spines, unmatched): {book_id: file_path, ...} and a list of
+    filenames that couldn't be matched to any book.
+
+    Files can be named:
+      - By book ID:    li_abc123.png         (always works)
+      - By title:      Dune.png              (matched via ABS)
+      - Author-title:  Frank Herbert - Dune.png
+      - Underscores:   The_Hobbit.png
+    """
+    matches = scan_spine_folder()
+    return dict(matches.spines), sorted(matches.unmatched)
 
 
 def scan_library_for_spines(books):
@@ -412,101 +1803,1731 @@ def scan_library_for_spines(books):
         print(f"ERROR: LIBRARY_PATH '{LIBRARY_PATH}' doesn't exist or isn't a directory.")
         return 0
 
-    ensure_spines_dir()
-    found = 0
+    ensure_spines_dir()
+    found = 0
+
+    for book in books:
+        abs_path = book["path"]  # e.g. /audiobooks/Author/Title
+
+        # Try to find the book folder relative to LIBRARY_PATH
+        candidates = [abs_path]
+
+        parts = Path(abs_path).parts
+        if len(parts) >= 2:
+            candidates.append(os.path.join(LIBRARY_PATH, *parts[-2:]))
+        if len(parts) >= 3:
+            candidates.append(os.path.join(LIBRARY_PATH, *parts[-3:]))
+        candidates.append(os.path.join(LIBRARY_PATH, abs_path.lstrip("/")))
+
+        for folder in candidates:
+            if not os.path.isdir(folder):
+                continue
+
+            for spine_name in ["spine.png", "spine.jpg", "spine.jpeg", "spine.webp"]:
+                spine_path = os.path.join(folder, spine_name)
+                if os.path.isfile(spine_path):
+                    ext = os.path.splitext(spine_name)[1]
+                    dest = os.path.join(SPINES_DIR, f"{book['id']}{ext}")
+
+                    if not os.path.exists(dest):
+                        import shutil
+                        shutil.copy2(spine_path, dest)
+                        print(f"  Found: {book['title']}")
+
+                    found += 1
+                    break
+            else:
+                continue
+            break
+
+    return found
+
+
+def build_manifest(spine_files, items=None, revision=0, details=None, generated=None):
+    """
+    Build the manifest JSON that tells the app which books have spines.
+    Pass `items` when the sorted ID list is already known, and `generated`
+    (a timestamp) to date it other than now.
+
+    "version" is the manifest format; "revision" goes up every time the
+    contents change (see ManifestLog). "spines" has the content hash, byte
+    size and pixel size of each book's image (see SpineInfoCache), so the
+    app can spot stale cached images and lay out a shelf before they load.
+    The hash also names the image at BLOB_ROUTE + sha256, a URL that can be
+    cached forever; clients build it themselves.
+    """
+    return {
+        "items": items if items is not None else sorted(spine_files.keys()),
+        "spines": dict(sorted((details or {}).items())),
+        "version": 1,
+        "revision": revision,
+        "count": len(spine_files),
+        "generated": (datetime.fromtimestamp(generated) if generated else datetime.now()).isoformat(),
+    }
+
+
+# How many manifest revisions (and how many IDs across them) to remember
+# for answering /api/spines/manifest?since=<revision>
+MANIFEST_LOG_REVISIONS = 500
+MANIFEST_LOG_IDS = 200000
+
+
+class ManifestLog:
+    """
+    Numbers manifest revisions and remembers which IDs each one added,
+    removed, or kept with a replaced image, so a client that already has
+    revision N can fetch just the difference instead of the whole list.
+
+    Only the most recent revisions are kept (bounded by count and by total
+    IDs). Asking for a revision older than that, or one this server never
+    issued, gets None and the caller sends the full manifest instead.
+
+    The counter is saved in the cache folder. After a restart it carries on
+    from there with an empty log, so revisions never repeat and old clients
+    get a full resync rather than a wrong delta.
+    """
+
+    FILENAME = "manifest-revision.json"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.revision = 0
+        self._entries = collections.deque()  # (revision, added, removed, replaced)
+        self._base = None  # oldest revision the entries can be diffed from
+        self._ids = 0
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path) as f:
+                    self.revision = int(json.load(f)["revision"])
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def record(self, added, removed, replaced=()):
+        """
+        Start a new revision with these changes. Returns its number.
+        `added` are IDs that had no spine before, `replaced` IDs whose
+        spine image changed.
+        """
+        with self._lock:
+            self.revision += 1
+            if self._base is None:
+                # The first revision we publish is the starting point; what
+                # came before it (e.g. before a restart) is unknown
+                self._base = self.revision
+            else:
+                entry = (self.revision, sorted(added), sorted(removed), sorted(replaced))
+                self._entries.append(entry)
+                self._ids += len(entry[1]) + len(entry[2]) + len(entry[3])
+                while len(self._entries) > MANIFEST_LOG_REVISIONS or \
+                        (self._ids > MANIFEST_LOG_IDS and len(self._entries) > 1):
+                    old = self._entries.popleft()
+                    self._base = old[0]
+                    self._ids -= len(old[1]) + len(old[2]) + len(old[3])
+            revision = self.revision
+
+        if self.path:
+            try:
+                write_json_atomic(self.path, {"revision": revision})
+            except OSError as e:
+                print(f"Could not save manifest revision: {e}")
+        return revision
+
+    def export(self):
+        """The log as plain data, for handing to worker processes."""
+        with self._lock:
+            return {"revision": self.revision, "base": self._base, "entries": list(self._entries)}
+
+    @classmethod
+    def restore(cls, data):
+        """A read-only copy of a log from export()."""
+        log = cls()
+        log.revision = data["revision"]
+        log._base = data["base"]
+        log._entries = collections.deque(tuple(entry) for entry in data["entries"])
+        return log
+
+    def delta(self, since, until):
+        """
+        Net changes between revision `since` and revision `until`, as
+        (added, removed) sorted lists; None if the log can't tell.
+
+        `added` holds IDs to (re)fetch: new or with a replaced image.
+        `removed` only holds IDs the client had at `since`; one that was
+        added and removed again in between isn't mentioned at all.
+        """
+        with self._lock:
+            if self._base is None or since < self._base or since > until:
+                return None
+
+            had = {}      # book_id → whether the client had it at `since`
+            present = {}  # book_id → whether it has a spine at `until`
+            for revision, entry_added, entry_removed, entry_replaced in self._entries:
+                if revision <= since:
+                    continue
+                if revision > until:
+                    break
+                for book_id in entry_added:
+                    had.setdefault(book_id, False)
+                    present[book_id] = True
+                for book_id in entry_replaced:
+                    had.setdefault(book_id, True)
+                    present[book_id] = True
+                for book_id in entry_removed:
+                    had.setdefault(book_id, True)
+                    present[book_id] = False
+        added = sorted(book_id for book_id, now in present.items() if now)
+        removed = sorted(book_id for book_id, now in present.items() if not now and had[book_id])
+        return added, removed
+
+
+# =============================================================================
+# COMPACT MANIFESTS
+# =============================================================================
+#
+# For big libraries the JSON manifest is the largest thing the app
+# downloads, and all it does with it is ask "does this book have a spine?".
+# Two binary alternatives carry the same snapshot in far fewer bytes. Ask
+# for one with ?format=ids / ?format=bloom, or with an Accept header naming
+# its content type. All integers are big-endian.
+#
+# ID set — application/vnd.spines.ids (exact):
+#
+#   4 bytes   "SPID"
+#   1 byte    format version (1)
+#   3 bytes   zero
+#   4 bytes   manifest revision (uint32)
+#   4 bytes   number of IDs (uint32)
+#   then for each ID, sorted by UTF-8 bytes:
+#     varint  bytes shared with the start of the previous ID
+#     varint  length of the rest
+#     bytes   the rest (UTF-8)
+#
+#   A varint is 7 bits per byte, low bits first, high bit set on every
+#   byte but the last (as in protobuf). Sent gzip-compressed when the client
+#   accepts it.
+#
+# Bloom filter — application/vnd.spines.bloom (may say yes wrongly, never
+# says no wrongly):
+#
+#   4 bytes   "SPBF"
+#   1 byte    format version (1)
+#   1 byte    k, the number of hash functions
+#   2 bytes   zero
+#   4 bytes   manifest revision (uint32)
+#   4 bytes   number of IDs (uint32)
+#   4 bytes   m, the number of bits (uint32)
+#   ceil(m/8) bytes of bits; bit i is (byte[i >> 3] >> (i & 7)) & 1
+#
+#   h1 is the 32-bit FNV-1a hash of the ID's UTF-8 bytes, and h2 is h1 run
+#   through MurmurHash3's 32-bit finalizer:
+#
+#     h2 = h1 ^ (h1 >>> 16);  h2 = h2 * 0x85ebca6b (mod 2^32)
+#     h2 = h2 ^ (h2 >>> 13);  h2 = h2 * 0xc2b2ae35 (mod 2^32)
+#     h2 = h2 ^ (h2 >>> 16)
+#
+#   The ID's bits are (h1 + i * h2) mod m for i = 0 .. k-1 (plain integer
+#   arithmetic, no 32-bit wraparound). The book has a spine only if all k
+#   bits are set.
+
+ID_SET_CONTENT_TYPE = "application/vnd.spines.ids"
+BLOOM_CONTENT_TYPE = "application/vnd.spines.bloom"
+
+FNV_PRIME = 0x01000193
+FNV_BASIS = 0x811c9dc5
+
+# Clamp for the &fp= a client can ask for
+BLOOM_FP_RANGE = (0.0001, 0.5)
+
+# (h1, h2) per book ID. IDs rarely change between snapshots, so each
+# rebuild only hashes the new ones.
+_bloom_hashes = {}
+_bloom_hashes_lock = threading.Lock()
+
+
+def fnv1a32(data):
+    h = FNV_BASIS
+    for byte in data:
+        h = ((h ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+def fmix32(h):
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xFFFFFFFF
+    return h ^ (h >> 16)
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def encode_id_set(items, revision):
+    """Encode a sorted list of book IDs in the "SPID" format above."""
+    out = bytearray(b"SPID")
+    out += struct.pack(">B3xII", 1, revision & 0xFFFFFFFF, len(items))
+    previous = b""
+    for book_id in items:
+        raw = book_id.encode()
+        shared = 0
+        limit = min(len(raw), len(previous))
+        while shared < limit and raw[shared] == previous[shared]:
+            shared += 1
+        out += _varint(shared)
+        out += _varint(len(raw) - shared)
+        out += raw[shared:]
+        previous = raw
+    return bytes(out)
+
+
+def bloom_parameters(count, fp_rate):
+    """Bits (m) and hash count (k) for `count` IDs at the given false-positive rate."""
+    m = max(64, math.ceil(-max(count, 1) * math.log(fp_rate) / (math.log(2) ** 2)))
+    m = (m + 7) // 8 * 8
+    k = max(1, min(32, round(m / max(count, 1) * math.log(2))))
+    return m, k
+
+
+def encode_bloom_filter(items, revision, fp_rate):
+    """Encode book IDs as an "SPBF" Bloom filter (see above)."""
+    m, k = bloom_parameters(len(items), fp_rate)
+    bits = bytearray(m // 8)
+
+    with _bloom_hashes_lock:
+        missing = [book_id for book_id in items if book_id not in _bloom_hashes]
+        for book_id in missing:
+            h1 = fnv1a32(book_id.encode())
+            _bloom_hashes[book_id] = (h1, fmix32(h1))
+        if len(_bloom_hashes) > 2 * len(items) + 1000:
+            keep = set(items)
+            for book_id in [b for b in _bloom_hashes if b not in keep]:
+                del _bloom_hashes[book_id]
+        hashes = [_bloom_hashes[book_id] for book_id in items]
+
+    for h1, h2 in hashes:
+        for i in range(k):
+            bit = (h1 + i * h2) % m
+            bits[bit >> 3] |= 1 << (bit & 7)
+
+    header = b"SPBF" + struct.pack(">BBxxIII", 1, k, revision & 0xFFFFFFFF, len(items), m)
+    return header + bytes(bits)
+
+
+# =============================================================================
+# BACKGROUND REFRESH
+# =============================================================================
+
+class SpineSnapshot:
+    """
+    One consistent view of the spines folder: what matched, what didn't,
+    and the manifest built from it.
+
+    Snapshots are never modified after they're built. A request grabs the
+    current one once and reads only from it, so a rescan finishing halfway
+    through a request can't mix old and new data.
+
+    `created` is for rebuilding a snapshot made elsewhere (a --workers
+    process loading the refresher's): with the same timestamp the manifest
+    comes out byte for byte the same, and so do its ETag and Last-Modified.
+    """
+
+    def __init__(self, spine_files, unmatched, stats=None, items=None, revision=0, details=None,
+                 created=None):
+        self.spine_files = spine_files
+        self.unmatched = unmatched
+        self.stats = stats or {}  # path → (size, mtime_ns), for validating caches
+        self.revision = revision
+        self.details = details or {}  # book_id → SpineInfoCache.describe() result
+        self.created = created or time.time()
+        self.manifest = build_manifest(spine_files, items, revision, self.details, self.created)
+
+        # Content hash → a file with those bytes, for /api/spines/blob/<sha256>.
+        # Books sharing an image share one entry.
+        self.hashes = {}  # path → sha256
+        self.blobs = {}
+        self.dimensions = {}  # sha256 → (width, height), where the headers told
+        for book_id, info in self.details.items():
+            path = spine_files.get(book_id)
+            if path:
+                self.hashes[path] = info["sha256"]
+                self.blobs.setdefault(info["sha256"], path)
+                if info.get("width") and info.get("height"):
+                    self.dimensions[info["sha256"]] = (info["width"], info["height"])
+
+        # JSON manifest bodies by content coding, built on first request.
+        # Catalog syncs and watcher events publish snapshot after snapshot,
+        # and most are replaced before anyone asks for their manifest.
+        self._bodies = {}
+        self._digest = None
+        self._bodies_lock = threading.Lock()
+
+        # Binary manifests, built the first time someone asks for them
+        self._compact = {}
+        self._compact_lock = threading.Lock()
+
+    # Content codings manifest_body() can produce
+    MANIFEST_CODINGS = ("identity", "gzip", "br") if brotli is not None else ("identity", "gzip")
+
+    def _identity_body(self):
+        """The serialized manifest and its digest. Call with _bodies_lock held."""
+        entry = self._bodies.get("identity")
+        if entry is None:
+            body = json.dumps(self.manifest, separators=(",", ":")).encode()
+            self._digest = hashlib.sha1(body).hexdigest()[:20]
+            entry = self._bodies["identity"] = (body, f'"m-{self._digest}"')
+        return entry
+
+    def manifest_etag(self, coding="identity"):
+        """ETag of the JSON manifest in `coding`, without compressing anything."""
+        with self._bodies_lock:
+            self._identity_body()
+            suffix = {"identity": "", "gzip": "-gz", "br": "-br"}[coding]
+            return f'"m-{self._digest}{suffix}"'
+
+    def manifest_body(self, coding):
+        """
+        (body, etag) of the JSON manifest in a coding from MANIFEST_CODINGS.
+        Each is built the first time it's asked for and then kept, so
+        later requests for it are a lookup.
+        """
+        with self._bodies_lock:
+            entry = self._bodies.get(coding)
+            if entry is not None:
+                return entry
+            body, _ = self._identity_body()
+            if coding == "gzip":
+                entry = (gzip.compress(body, 6), f'"m-{self._digest}-gz"')
+            elif coding == "br":
+                entry = (brotli.compress(body, quality=5), f'"m-{self._digest}-br"')
+            else:
+                return self._bodies["identity"]
+            self._bodies[coding] = entry
+            return entry
+
+    def compact_manifest(self, fmt, fp_rate=BLOOM_FP_RATE):
+        """
+        Bodies for a binary manifest ("ids" or "bloom"), keyed by content
+        coding like manifest_body(). Built on first use and kept with the
+        snapshot, so every later request for the same format is a lookup.
+        """
+        key = (fmt, fp_rate)
+        with self._compact_lock:
+            bodies = self._compact.get(key)
+            if bodies is not None:
+                return bodies
+
+            items = self.manifest["items"]
+            tag = self.manifest_etag().strip('"')
+            if fmt == "ids":
+                body = encode_id_set(items, self.revision)
+                bodies = {
+                    "identity": (body, f'"{tag}-ids"'),
+                    "gzip": (gzip.compress(body, 9), f'"{tag}-ids-gz"'),
+                }
+            else:
+                # Filter bits are random-looking; compressing them gains nothing
+                body = encode_bloom_filter(items, self.revision, fp_rate)
+                bodies = {"identity": (body, f'"{tag}-bloom-{fp_rate:g}"')}
+
+            # Odd fp values aren't worth remembering; the common ones are
+            if fmt == "ids" or len(self._compact) < 4:
+                self._compact[key] = bodies
+            return bodies
+
+    def patched(self, spine_files, unmatched, stats, changed, revision=0, details=None):
+        """
+        Build the next snapshot when only the book IDs in `changed` may have
+        gained or lost a spine. Patches the sorted ID list instead of
+        re-sorting the whole library.
+        """
+        items = list(self.manifest["items"])
+        for book_id in changed:
+            pos = bisect.bisect_left(items, book_id)
+            present = pos < len(items) and items[pos] == book_id
+            if book_id in spine_files and not present:
+                items.insert(pos, book_id)
+            elif book_id not in spine_files and present:
+                del items[pos]
+        return SpineSnapshot(spine_files, unmatched, stats, items, revision, details)
+
+    def same_as(self, spine_files, unmatched, stats):
+        """True if a fresh scan found exactly what this snapshot already has."""
+        return self.spine_files == spine_files and self.stats == stats and \
+            sorted(self.unmatched) == sorted(unmatched)
+
+
+class SpineRefresher:
+    """
+    Re-scans the spines folder on a background thread.
+
+    The scan and the manifest are built off the request path and then
+    swapped into SpineHandler in a single assignment. If nothing changed,
+    the current snapshot is kept, so the manifest isn't rebuilt for nothing.
+
+    A FolderWatcher can also feed it individual changed filenames through
+    apply_changes(), and CatalogSync can feed it book changes through
+    apply_catalog_changes(); both re-match just the files affected.
+    """
+
+    def __init__(self, interval=SCAN_INTERVAL, match_cache=None, byte_cache=None, manifest_log=None,
+                 info_cache=None, variants=None, on_publish=None):
+        self.interval = interval
+        self.match_cache = match_cache
+        self.byte_cache = byte_cache
+        self.variants = variants
+        self.on_publish = on_publish
+        self.manifest_log = manifest_log or ManifestLog()
+        self.info_cache = info_cache or SpineInfoCache()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._matches = SpineMatches()
+
+    def refresh(self):
+        """Scan now and publish a new snapshot if anything changed. Returns the current snapshot."""
+        with self._lock:
+            self._matches = scan_spine_folder(self.match_cache)
+            spines, unmatched = dict(self._matches.spines), sorted(self._matches.unmatched)
+            stats = self._matches.served_stats()
+            current = SpineHandler._snapshot
+            if current is None or not current.same_as(spines, unmatched, stats):
+                old_files = current.spine_files if current else {}
+                old_stats = current.stats if current else {}
+                updated = [
+                    book_id for book_id, path in spines.items()
+                    if old_files.get(book_id) != path or old_stats.get(path) != stats[path]
+                ]
+                revision = self.manifest_log.record(
+                    [b for b in updated if b not in old_files],
+                    old_files.keys() - spines.keys(),
+                    [b for b in updated if b in old_files],
+                )
+                details = self._describe(spines, stats)
+                self.info_cache.retain(self._matches.files)
+                self.info_cache.save()
+                self._publish(SpineSnapshot(spines, unmatched, stats, revision=revision, details=details))
+            return SpineHandler._snapshot
+
+    def apply_changes(self, filenames):
+        """
+        Re-match only the given files (added, renamed or removed) and
+        publish a patched snapshot if that changed anything.
+        """
+        with self._lock:
+            matches = self._matches
+            changed = set()
+            cache = self.match_cache
+            for filename in filenames:
+                st = stat_spine_file(filename)
+                if st is not None:
+                    if filename not in matches.files:
+                        changed |= matches.match(filename, st, cache)
+                    else:
+                        changed |= matches.touch(filename, st)
+                else:
+                    changed |= matches.remove(filename)
+                    if cache:
+                        cache.forget(filename)
+            if cache:
+                cache.save()
+            self._publish_patch(changed)
+
+    def apply_catalog_changes(self, upserts, removed_ids):
+        """
+        Patch the book index with books added, changed or removed in ABS,
+        then re-match only the files that could be affected: files that
+        didn't match anything, files matched to a book whose keys changed,
+        and unmatched or loosely matched (fuzzy, typo, split) files that
+        share a match token with a changed book's keys, since only those
+        could now match it. Returns the number of files re-matched.
+        """
+        with self._lock:
+            changed_books = patch_book_index(upserts, removed_ids)
+            if not changed_books:
+                return 0
+
+            tokens = set()
+            with _index_lock:
+                for book_id in changed_books:
+                    book = _books_by_id.get(book_id)
+                    for key in title_keys(book) if book else ():
+                        tokens |= match_tokens(key)
+
+            matches = self._matches
+            targets = set()
+            for book_id in changed_books:
+                targets |= matches.by_book.get(book_id, set())
+            loose = set(matches.unmatched)
+            loose.update(
+                filename for filename, (_, match_type) in matches.files.items()
+                if match_type not in FIRM_MATCH_TYPES
+            )
+            targets.update(
+                filename for filename in loose - targets
+                if not tokens.isdisjoint(match_tokens(normalize(os.path.splitext(filename)[0])))
+            )
+
+            # ID and exact matches of every other file still hold: their
+            # key is owned by a book that didn't change, and nothing can
+            # rank above an exact match
+            cache = self.match_cache
+            if cache:
+                cache.rebase(matching_index()[2])
+
+            changed = set()
+            for filename in targets:
+                if cache:
+                    cache.forget(filename)
+                st = stat_spine_file(filename)
+                if st is not None:
+                    changed |= matches.match(filename, st, cache)
+                else:
+                    changed |= matches.remove(filename)
+            if cache:
+                cache.save()
+            self._publish_patch(changed)
+            return len(targets)
+
+    def _publish_patch(self, changed):
+        """Publish a snapshot patched for the book IDs in `changed`, if anything differs."""
+        matches = self._matches
+        current = SpineHandler._snapshot
+        unmatched = sorted(matches.unmatched)
+        stats = matches.served_stats()
+        spines = dict(matches.spines)
+        if current is None:
+            revision = self.manifest_log.record(spines, ())
+            details = self._describe(spines, stats)
+            self._publish(SpineSnapshot(spines, unmatched, stats, revision=revision, details=details))
+        elif changed or unmatched != current.unmatched:
+            updated = [b for b in changed if b in spines]
+            removed = [b for b in changed if b not in spines and b in current.spine_files]
+            revision = self.manifest_log.record(
+                [b for b in updated if b not in current.spine_files],
+                removed,
+                [b for b in updated if b in current.spine_files],
+            )
+            details = dict(current.details)
+            for book_id in removed:
+                details.pop(book_id, None)
+            details.update(self._describe({b: spines[b] for b in updated}, stats))
+            self._publish(current.patched(spines, unmatched, stats, changed, revision, details))
+        self.info_cache.save()
+
+    def _describe(self, spines, stats):
+        """Manifest details (hash, sizes) for the given book_id → path map."""
+        details = {}
+        with _phases.phase("describe_spines"):
+            for book_id, path in spines.items():
+                info = self.info_cache.describe(path, stats[path])
+                if info is not None:
+                    details[book_id] = info
+        return details
+
+    def _publish(self, snapshot):
+        """
+        Swap in a new snapshot, drop cached bytes for files that changed or
+        went away, and queue WebP/AVIF copies of any new images.
+        """
+        previous = SpineHandler._snapshot
+        SpineHandler._snapshot = snapshot
+        if self.byte_cache and previous is not None:
+            for path, stamp in previous.stats.items():
+                if snapshot.stats.get(path) != stamp:
+                    self.byte_cache.invalidate(path)
+        if self.variants and (previous is None or previous.blobs != snapshot.blobs):
+            self.variants.schedule(snapshot.blobs)
+        if self.on_publish:
+            self.on_publish(snapshot)
+
+    def request_rescan(self):
+        """Ask the background thread to scan as soon as possible."""
+        self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="spine-refresher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            started = time.perf_counter()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Rescan failed: {e}")
+            if _phases.enabled:
+                report_profile("rescan", time.perf_counter() - started)
+
+
+# =============================================================================
+# CATALOG SYNC
+# =============================================================================
+
+def fetch_catalog_changes(reconcile=False):
+    """
+    Ask ABS what changed since the installed index was built.
+    Returns (upserts, removed_ids), or None if ABS couldn't be asked.
+
+    Per library, items are read newest-updated first until reaching the
+    newest update we already have. ABS can't list deletions, so the
+    library is fetched in full and its IDs compared with ours whenever
+    that can't be trusted to be the whole story: the total doesn't add
+    up, ABS ignored the sort order, or `reconcile` is set (CatalogSync
+    does that every CATALOG_RECONCILE_INTERVAL, which catches e.g. a
+    delete plus a restore of an old item). Libraries we've never seen are
+    fetched in full.
+    """
+    libraries = get_all_libraries()
+    if not libraries:
+        return None
+
+    with _index_lock:
+        known_books = list(_books_by_id.values())
+    known = {}  # library ID → {book ID: book}
+    for book in known_books:
+        known.setdefault(book["libraryId"], {})[book["id"]] = book
+
+    fetched = {}
+    removed = set()
+    for lib in libraries:
+        lib_id = lib["id"]
+        lib_name = lib.get("name", lib_id)
+        have = known.pop(lib_id, {})
+
+        if not have:
+            for book in get_all_books([lib]):
+                fetched[book["id"]] = book
+            continue
+
+        if reconcile:
+            total, changed = None, None
+        else:
+            since = max(book.get("updatedAt", 0) for book in have.values())
+            result = get_library_changes(lib_id, lib_name, since)
+            if result is None:
+                return None
+            total, changed = result
+
+        if changed is None or total != len(set(have) | {book["id"] for book in changed}):
+            # Something was deleted (or moved), or the changes can't be
+            # trusted: compare against the full list of IDs
+            if total is None:
+                result = get_library_page(lib_id, lib_name, 0)
+                if result is None:
+                    return None
+                total = result[0]
+            books = get_all_books([lib])
+            if len(books) != total:
+                return None  # a page failed; don't mistake missing pages for deletions
+            removed |= set(have) - {book["id"] for book in books}
+            changed = books
+
+        for book in changed:
+            fetched[book["id"]] = book
+
+    # Libraries that disappeared take their books with them
+    for books in known.values():
+        removed |= set(books)
+
+    with _index_lock:
+        upserts = [book for book in fetched.values() if _books_by_id.get(book["id"]) != book]
+    removed -= set(fetched)
+    return upserts, removed
+
+
+class CatalogSync:
+    """
+    Keeps the book index in step with ABS without re-fetching the catalog.
+
+    Every `interval` seconds it asks ABS only for what changed (see
+    fetch_catalog_changes), patches the index in place and re-matches the
+    few spine files that could be affected. Books added to ABS become
+    matchable by title without a restart.
+    """
+
+    def __init__(self, refresher, interval=SYNC_INTERVAL):
+        self.refresher = refresher
+        self.interval = interval
+        self._thread = None
+        self._reconciled = time.monotonic()
+
+    def sync(self):
+        """Run one sync. Returns False if ABS couldn't be reached."""
+        reconcile = time.monotonic() - self._reconciled >= CATALOG_RECONCILE_INTERVAL
+        changes = fetch_catalog_changes(reconcile)
+        if changes is None:
+            print("WARNING: Catalog sync with ABS failed; keeping the current index.")
+            return False
+        if reconcile:
+            self._reconciled = time.monotonic()
+
+        upserts, removed = changes
+        if not upserts and not removed:
+            return True
+
+        rematched = self.refresher.apply_catalog_changes(upserts, removed)
+        save_book_index_snapshot()
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Catalog sync: "
+              f"{len(upserts)} books added/updated, {len(removed)} removed, "
+              f"{rematched} spine files re-matched")
+        return True
+
+    def start(self, immediately=False):
+        self._thread = threading.Thread(
+            target=self._run, args=(immediately,), name="catalog-sync", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, immediately):
+        if not immediately:
+            time.sleep(self.interval)
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Catalog sync failed: {e}")
+            time.sleep(self.interval)
+
+
+# =============================================================================
+# FOLDER WATCHING
+# =============================================================================
+
+# inotify event bits (from <sys/inotify.h>)
+IN_CREATE = 0x00000100
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# Seconds to keep collecting events after the first one, so a burst
+# (e.g. copying 500 spines in) becomes one re-match instead of 500
+WATCH_DEBOUNCE = 0.25
+
+# With a watcher running, the periodic full rescan is only a safety net
+WATCH_RESCAN_INTERVAL = 600
+
+
+class FolderWatcher:
+    """
+    Watches the spines folder with Linux inotify and tells a SpineRefresher
+    exactly which filenames were added, renamed or removed.
+
+    Uses ctypes against the C library, so there's still nothing to install.
+    Call start() and check its return value: False means inotify isn't
+    available here (macOS, Windows, some containers) and the caller should
+    rely on periodic polling instead.
+
+    Note: inotify only sees changes made through this machine's kernel.
+    For spines on a network share edited from elsewhere, use --watch poll.
+    """
+
+    def __init__(self, refresher, path=None):
+        self.refresher = refresher
+        self.path = path or SPINES_DIR
+        self._fd = None
+        self._thread = None
+        self._poll_interval = refresher.interval
+
+    def start(self):
+        """Begin watching. Returns False if inotify can't be used."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return False
+
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return False
+
+        mask = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+            IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+        if inotify_add_watch(fd, os.fsencode(self.path), mask) < 0:
+            err = ctypes.get_errno()
+            print(f"Cannot watch {self.path}: {os.strerror(err)}")
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        self._poll_interval = self.refresher.interval
+        self.refresher.interval = max(self._poll_interval, WATCH_RESCAN_INTERVAL)
+        self._thread = threading.Thread(target=self._run, name="spine-watcher", daemon=True)
+        self._thread.start()
+        return True
+
+    def _read_events(self):
+        """Read one batch of events. Returns (filenames, needs_full_rescan, watch_gone)."""
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return set(), False, False
+            raise
+
+        names = set()
+        rescan = gone = False
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True  # Kernel dropped events; we no longer know what changed
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                gone = True
+            if raw_name:
+                names.add(os.fsdecode(raw_name))
+        return names, rescan, gone
+
+    def _run(self):
+        while True:
+            names, rescan, gone = self._read_events()
+
+            # Debounce: keep draining until the folder goes quiet
+            while not gone:
+                ready, _, _ = select.select([self._fd], [], [], WATCH_DEBOUNCE)
+                if not ready:
+                    break
+                more, more_rescan, gone = self._read_events()
+                names |= more
+                rescan = rescan or more_rescan
+
+            try:
+                if rescan or gone:
+                    self.refresher.request_rescan()
+                elif names:
+                    self.refresher.apply_changes(names)
+            except Exception as e:
+                print(f"Applying folder changes failed: {e}")
+
+            if gone:
+                print(f"Spines folder {self.path} was moved or deleted; falling back to polling.")
+                self.refresher.interval = self._poll_interval
+                os.close(self._fd)
+                self._fd = None
+                return
+
+
+# =============================================================================
+# IMAGE CACHE
+# =============================================================================
+
+class SpineByteCache:
+    """
+    Memory-bounded LRU cache of spine image bytes.
+
+    A shelf screen asks for the same few hundred spines over and over;
+    this keeps them in memory along with their content type.
+
+    Images with a known content hash are keyed by that hash, so books
+    sharing an image share one entry, and the entry stays valid as long as
+    any file still has those bytes. Others are keyed by path and stored
+    with the file's (size, mtime_ns) from the snapshot, and only served
+    while the snapshot still agrees; SpineRefresher drops those as soon as
+    it sees a file change. Images bigger than an eighth of the cache are
+    never cached, so one huge scan can't flush everything.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # sha256 or path → (data, content_type, stamp)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp):
+        """Return (data, content_type) if cached for this exact file version, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, stamp, data, content_type):
+        if len(data) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (data, content_type, stamp)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# =============================================================================
+# RESIZED SPINES
+# =============================================================================
+
+# Spine heights and widths the server will scale to. Requests are snapped
+# to the nearest one so a handful of sizes cover every screen.
+SPINE_HEIGHTS = (150, 200, 300, 400, 600, 800)
+SPINE_WIDTHS = (24, 32, 48, 64, 96, 128)
+
+# Disk space for resized copies, in MB; the oldest go first
+DERIVATIVE_CACHE_MB = 512
+
+# Most "no smaller" and "unreadable" answers to remember before starting over
+DERIVATIVE_MEMO_MAX = 20000
+
+
+def snap_size(value, allowed):
+    """The entry of `allowed` closest to `value` (ties go to the smaller)."""
+    return min(allowed, key=lambda size: (abs(size - value), size))
+
+
+def resize_scale(dimensions, height, width):
+    """Factor that fits a (width, height) image within `height` and/or `width`."""
+    return min(
+        height / dimensions[1] if height else 1.0,
+        width / dimensions[0] if width else 1.0,
+    )
+
+
+class DerivativeCache:
+    """
+    Resized copies of spine images, kept in the "derivatives" cache folder.
+
+    Files are named by the source's content hash and the requested size, so
+    a copy is correct for as long as it exists and any book with the same
+    image shares it. When several requests want the same missing copy at
+    once, one of them resizes and the others wait for its result.
+
+    Images are never scaled up; if the source is already small enough the
+    caller is told to send it as-is. That's decided from the dimensions in
+    the manifest details when the caller has them, and remembered
+    otherwise, so it doesn't cost a Pillow open per request.
+
+    Serving a copy bumps its mtime, so the budget evicts the least
+    recently used copies first.
+    """
+
+    SAVE_OPTIONS = {
+        "PNG": {"optimize": True},
+        "JPEG": {"quality": 85, "optimize": True},
+        "WEBP": {"quality": 85, "method": 4},
+    }
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.resizes = 0
+        self._inflight = {}  # filename → Event set when its resize finishes
+        self._unreadable = set()  # hashes of sources Pillow couldn't open
+        self._fits = set()        # filenames of copies that would be no smaller
+        self._lock = threading.Lock()
+        self._size = None    # bytes on disk, counted on first use
+
+    @staticmethod
+    def folder():
+        path = cache_path("derivatives")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def get(self, source, sha256, height=None, width=None, dimensions=None):
+        """
+        Path of `source` scaled to fit `height` and/or `width`, making it if
+        needed. Returns None when the original should be sent instead
+        (already small enough, or not an image Pillow can read).
+        `dimensions` is the source's (width, height), if known.
+        """
+        if sha256 in self._unreadable:
+            return None
+        if dimensions and resize_scale(dimensions, height, width) >= 1.0:
+            return None
+        ext = os.path.splitext(source)[1].lower()
+        filename = f"{sha256}-{height or 0}x{width or 0}{ext}"
+        if filename in self._fits:
+            return None
+        path = os.path.join(self.folder(), filename)
+
+        while True:
+            try:
+                os.utime(path)  # mark as recently used
+                return path
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                done = self._inflight.get(filename)
+                if done is None:
+                    done = self._inflight[filename] = threading.Event()
+                    break
+            # Someone else is making it; wait, then look again
+            done.wait()
+            if not os.path.exists(path):
+                return None
+
+        try:
+            made = self._resize(source, sha256, path, height, width)
+            if made:
+                return path
+            if made is False:
+                self._remember(self._fits, filename)
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Could not resize {os.path.basename(source)}: {e}")
+            self._remember(self._unreadable, sha256)
+            return None
+        finally:
+            with self._lock:
+                del self._inflight[filename]
+            done.set()
+
+    @staticmethod
+    def _remember(memo, item):
+        # Sources come and go; rather than track which entries still
+        # matter, start over once the set gets big
+        if len(memo) >= DERIVATIVE_MEMO_MAX:
+            memo.clear()
+        memo.add(item)
+
+    def _resize(self, source, sha256, path, height, width):
+        """
+        Write `source` scaled down to `path`. Returns True if it did, False
+        if the image is already small enough, and None if the file no
+        longer has the content hash `sha256` (the copy would be filed
+        under the wrong hash; the next scan picks up the new image).
+        """
+        with open(source, "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != sha256:
+            return None
+        with Image.open(io.BytesIO(data)) as image:
+            scale = resize_scale(image.size, height, width)
+            if scale >= 1.0:
+                return False
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            fmt = image.format
+            if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            resized = image.resize(size, Image.LANCZOS)
+
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        resized.save(tmp, fmt, **self.SAVE_OPTIONS.get(fmt, {}))
+        os.replace(tmp, path)
+        self.resizes += 1
+        self._account(os.path.getsize(path))
+        return True
+
+    def _account(self, added):
+        """Track disk use and delete the oldest copies when over budget."""
+        folder = self.folder()
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            entries = sorted(
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in os.scandir(folder) if entry.is_file()
+            )
+            self._size = sum(size for _, size, _ in entries)
+            for _, size, old in entries:
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(old)
+                    self._size -= size
+                except OSError:
+                    pass
+
+
+# =============================================================================
+# FORMAT VARIANTS
+# =============================================================================
+
+# Most spines are heavy PNGs. When Pillow can encode them, WebP and AVIF
+# copies are made ahead of time and sent to clients whose Accept header
+# says they can take them. Preferred first.
+VARIANT_FORMATS = (("avif", "AVIF", "image/avif"), ("webp", "WEBP", "image/webp"))
+
+# Processes for encoding variants (encoding is CPU-bound, so threads
+# wouldn't help)
+VARIANT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+def variant_formats():
+    """Extensions of the variant formats this Pillow can encode (none without Pillow)."""
+    if Image is None:
+        return ()
+    Image.init()
+    return tuple(ext for ext, pil_format, _ in VARIANT_FORMATS if pil_format in Image.SAVE)
+
+
+def encode_variant(source, sha256, dest, ext):
+    """
+    Encode `source` as `ext` ("webp" or "avif") into `dest`. Runs in a
+    worker process. Returns the new file's size; None if it wouldn't be
+    smaller than the original; False if `source` no longer has the content
+    hash `sha256`, since the copy would be filed under the wrong hash (the
+    next snapshot brings the new one). Nothing is written in either case.
+    """
+    pil_format = dict((e, f) for e, f, _ in VARIANT_FORMATS)[ext]
+    options = {"quality": 85, "method": 6} if ext == "webp" else {"quality": 60}
+    with open(source, "rb") as f:
+        original = f.read()
+    if hashlib.sha256(original).hexdigest() != sha256:
+        return False
+    with Image.open(io.BytesIO(original)) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **options)
+    data = buffer.getvalue()
+    if len(data) >= len(original):
+        return None
+    tmp = f"{dest}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dest)
+    return len(data)
+
+
+class VariantStore:
+    """
+    WebP/AVIF copies of spine images, in a ".variants" folder next to the
+    originals, named <sha256>.<ext>.
+
+    schedule() is handed every new snapshot and queues whatever copies are
+    missing on a process pool; lookup() only ever picks a file that already
+    exists, so a request never waits for an encoder. Copies whose source is
+    gone from the snapshot are deleted. Copies that wouldn't be smaller
+    than the original are skipped and remembered.
+    """
+
+    def __init__(self, workers=VARIANT_WORKERS):
+        self.formats = variant_formats()
+        self.workers = workers
+        self.folder = os.path.join(SPINES_DIR, ".variants")
+        self._available = {}  # sha256 → set of extensions on disk
+        self._skipped = set()  # (sha256, ext) not worth keeping
+        self._pending = set()  # (sha256, ext) queued or encoding
+        self._executor = None
+        self._lock = threading.Lock()
+
+        if self.formats:
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                if not os.access(self.folder, os.W_OK):
+                    raise PermissionError(errno.EACCES, "not writable", self.folder)
+            except OSError as e:
+                print(f"WARNING: Can't keep WebP/AVIF copies ({e}). Sending originals only.")
+                self.formats = ()
+                return
+            self.reload()
+
+    def reload(self):
+        """Re-read which copies exist (for processes that don't make them)."""
+        available = {}
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            names = []
+        for name in names:
+            sha256, _, ext = name.partition(".")
+            if ext in self.formats:
+                available.setdefault(sha256, set()).add(ext)
+        self._available = available
+
+    def _pool(self):
+        if self._executor is None:
+            # Spawned, not forked: the server process is full of threads
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            if sys.version_info >= (3, 7):
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def path(self, sha256, ext):
+        return os.path.join(self.folder, f"{sha256}.{ext}")
+
+    def schedule(self, blobs):
+        """
+        Queue encoding for every (image, format) in `blobs` (sha256 → path)
+        that has no copy yet, and delete copies nothing uses any more.
+        Returns the futures queued.
+        """
+        if not self.formats:
+            return []
+        futures = []
+        with self._lock:
+            for sha256 in [sha for sha in self._available if sha not in blobs]:
+                for ext in self._available.pop(sha256):
+                    try:
+                        os.remove(self.path(sha256, ext))
+                    except OSError:
+                        pass
+
+            for sha256, source in blobs.items():
+                have = self._available.get(sha256, set())
+                for ext in self.formats:
+                    job = (sha256, ext)
+                    if ext in have or job in self._pending or job in self._skipped:
+                        continue
+                    if os.path.splitext(source)[1].lower() == f".{ext}":
+                        continue
+                    self._pending.add(job)
+                    future = self._pool().submit(encode_variant, source, sha256, self.path(sha256, ext), ext)
+                    future.add_done_callback(lambda f, job=job: self._finished(job, f))
+                    futures.append(future)
+        return futures
+
+    def _finished(self, job, future):
+        sha256, ext = job
+        with self._lock:
+            self._pending.discard(job)
+            error = future.exception()
+            if error is not None:
+                print(f"Could not make {ext} copy of {sha256[:12]}: {error}")
+                self._skipped.add(job)
+            elif future.result() is None:
+                self._skipped.add(job)
+            elif future.result():
+                self._available.setdefault(sha256, set()).add(ext)
+
+    def lookup(self, sha256, accept):
+        """(path, content_type, ext) of the best copy the Accept header allows, or None."""
+        have = self._available.get(sha256)
+        if not have:
+            return None
+        for ext, _, content_type in VARIANT_FORMATS:
+            if ext in have and accepts(accept, content_type):
+                return self.path(sha256, ext), content_type, ext
+        return None
 
-    for book in books:
-        abs_path = book["path"]  # e.g. /audiobooks/Author/Title
 
-        # Try to find the book folder relative to LIBRARY_PATH
-        candidates = [abs_path]
+def accepts(accept, content_type):
+    """True if an Accept header explicitly lists `content_type` with q > 0."""
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        if media.strip().lower() != content_type:
+            continue
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
 
-        parts = Path(abs_path).parts
-        if len(parts) >= 2:
-            candidates.append(os.path.join(LIBRARY_PATH, *parts[-2:]))
-        if len(parts) >= 3:
-            candidates.append(os.path.join(LIBRARY_PATH, *parts[-3:]))
-        candidates.append(os.path.join(LIBRARY_PATH, abs_path.lstrip("/")))
 
-        for folder in candidates:
-            if not os.path.isdir(folder):
-                continue
+# =============================================================================
+# ATLASES
+# =============================================================================
 
-            for spine_name in ["spine.png", "spine.jpg", "spine.jpeg", "spine.webp"]:
-                spine_path = os.path.join(folder, spine_name)
-                if os.path.isfile(spine_path):
-                    ext = os.path.splitext(spine_name)[1]
-                    dest = os.path.join(SPINES_DIR, f"{book['id']}{ext}")
+# Largest atlas page, in pixels (a safe texture size on phones)
+ATLAS_PAGE_SIZE = 4096
 
-                    if not os.path.exists(dest):
-                        import shutil
-                        shutil.copy2(spine_path, dest)
-                        print(f"  Found: {book['title']}")
+# How many built atlases to keep on disk; the least recently used go first
+ATLAS_CACHE_COUNT = 64
 
-                    found += 1
-                    break
-            else:
-                continue
-            break
+# Bump when the atlas layout changes so old atlases aren't reused
+ATLAS_LAYOUT_VERSION = 1
 
-    return found
+# Most atlases waiting to be built; requests for more are turned away
+ATLAS_MAX_PENDING = 8
+
+# Seconds a failed build is remembered and reported instead of retried
+ATLAS_FAILURE_TTL = 60
 
 
-def build_manifest(spine_files):
+class AtlasBuilder:
     """
-    Build the manifest JSON that tells the app which books have spines.
+    Packs spines into a few large images ("atlases") plus a JSON map of
+    where each book's spine is, so the app can draw a shelf from a couple
+    of textures instead of decoding hundreds of files.
+
+    Atlases are built one at a time on a background thread and kept in the
+    "atlases" cache folder, named by a key made from the height and every
+    member's ID and content hash. Any change to the set or to an image
+    gives a new key, so a built atlas never goes stale and can be cached by
+    clients forever.
+
+    Layout: every spine is scaled to the atlas height and placed left to
+    right in rows, rows stacked top to bottom, starting a new page when a
+    page is full. Books that share an image share one sprite.
     """
-    return {
-        "items": sorted(spine_files.keys()),
-        "version": 1,
-        "count": len(spine_files),
-        "generated": datetime.now().isoformat(),
-    }
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="atlas")
+        self._building = {}  # key → Future
+        self._failed = {}    # key → (time.monotonic() of the failure, message)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def folder():
+        path = cache_path("atlases")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def atlas_key(members, height):
+        """Key for an atlas of `members` [(book_id, path, sha256)] at `height`."""
+        digest = hashlib.sha1(f"v{ATLAS_LAYOUT_VERSION}:{height}".encode())
+        for book_id, _, sha256 in sorted(members):
+            digest.update(f"\n{book_id}:{sha256}".encode())
+        return digest.hexdigest()
+
+    def load(self, key):
+        """The map of a built atlas, or None if it hasn't been built."""
+        path = os.path.join(self.folder(), f"{key}.json")
+        try:
+            with open(path) as f:
+                atlas = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return atlas
+
+    def page_path(self, key, page):
+        return os.path.join(self.folder(), f"{key}-{page}.png")
+
+    def request(self, members, height):
+        """
+        Returns (key, atlas map, None) if the atlas is built. Otherwise
+        returns (key, None, problem), where problem is None once a build is
+        queued, or a message when it can't be: the queue already holds
+        ATLAS_MAX_PENDING builds, or this atlas failed less than
+        ATLAS_FAILURE_TTL seconds ago.
+        """
+        key = self.atlas_key(members, height)
+        atlas = self.load(key)
+        if atlas is not None:
+            return key, atlas, None
+        with self._lock:
+            if key in self._building:
+                return key, None, None
+            failed = self._failed.get(key)
+            if failed is not None:
+                if time.monotonic() - failed[0] < ATLAS_FAILURE_TTL:
+                    return key, None, failed[1]
+                del self._failed[key]
+            if len(self._building) >= ATLAS_MAX_PENDING:
+                return key, None, "Too many atlases being built"
+            future = self._executor.submit(self._build, key, members, height)
+            future.add_done_callback(lambda _: self._finished(key))
+            self._building[key] = future
+        return key, None, None
+
+    def _finished(self, key):
+        with self._lock:
+            future = self._building.pop(key, None)
+            error = future.exception() if future is not None else None
+            if error is not None:
+                now = time.monotonic()
+                for old in [k for k, (at, _) in self._failed.items() if now - at >= ATLAS_FAILURE_TTL]:
+                    del self._failed[old]
+                self._failed[key] = (now, f"Atlas build failed: {error}")
+        if error is not None:
+            print(f"Atlas build failed: {error}")
+
+    def _build(self, key, members, height):
+        started = time.time()
+
+        # One sprite per distinct image, scaled to the atlas height. Files
+        # Pillow can't read are left out (and reported as missing).
+        sprites = {}  # sha256 → (path, width)
+        for _, path, sha256 in members:
+            if sha256 in sprites:
+                continue
+            try:
+                with Image.open(path) as image:
+                    width = max(1, round(image.width * height / image.height))
+            except (OSError, ValueError, ZeroDivisionError) as e:
+                print(f"Leaving {os.path.basename(path)} out of atlas: {e}")
+                continue
+            sprites[sha256] = (path, min(width, ATLAS_PAGE_SIZE))
+
+        # Shelf packing: fill rows left to right, pages top to bottom
+        placements = {}  # sha256 → [page, x, y, w, h]
+        pages = []       # [width, height] of each page
+        rows_per_page = max(1, ATLAS_PAGE_SIZE // height)
+        page = x = row = 0
+        used_width = 0
+        for sha256, (_, width) in sorted(sprites.items(), key=lambda item: item[1][0]):
+            if x + width > ATLAS_PAGE_SIZE:
+                used_width = max(used_width, x)
+                x, row = 0, row + 1
+                if row == rows_per_page:
+                    pages.append([used_width, rows_per_page * height])
+                    page, row, used_width = page + 1, 0, 0
+            placements[sha256] = [page, x, row * height, width, height]
+            x += width
+        if sprites:
+            pages.append([max(used_width, x), (row + 1) * height])
+
+        for number, (page_width, page_height) in enumerate(pages):
+            sheet = Image.new("RGBA", (page_width, page_height), (0, 0, 0, 0))
+            for sha256, (on_page, x, y, width, _) in placements.items():
+                if on_page != number:
+                    continue
+                path = sprites[sha256][0]
+                with open(path, "rb") as f:
+                    data = f.read()
+                # The file was replaced after the snapshot; don't file the
+                # new image under the old hash (the next request rebuilds)
+                if hashlib.sha256(data).hexdigest() != sha256:
+                    raise RuntimeError(f"{os.path.basename(path)} changed while building an atlas")
+                with Image.open(io.BytesIO(data)) as image:
+                    sheet.paste(image.convert("RGBA").resize((width, height), Image.LANCZOS), (x, y))
+            tmp = self.page_path(key, number) + f".tmp{os.getpid()}"
+            sheet.save(tmp, "PNG", optimize=True)
+            os.replace(tmp, self.page_path(key, number))
+
+        atlas = {
+            "key": key,
+            "height": height,
+            "pages": [
+                {"url": f"{ATLAS_ROUTE}{key}/{number}.png", "width": w, "height": h}
+                for number, (w, h) in enumerate(pages)
+            ],
+            "sprites": {
+                book_id: placements[sha256] for book_id, _, sha256 in members if sha256 in placements
+            },
+        }
+        # The map goes last: once it exists the pages are complete
+        write_json_atomic(os.path.join(self.folder(), f"{key}.json"), atlas)
+        print(f"Built atlas {key[:8]}: {len(members)} spines on {len(pages)} pages "
+              f"in {time.time() - started:.1f}s")
+        self._prune()
+
+    def _prune(self):
+        """Delete the least recently used atlases beyond ATLAS_CACHE_COUNT."""
+        folder = self.folder()
+        maps = []
+        for name in os.listdir(folder):
+            if name.endswith(".json"):
+                try:
+                    maps.append((os.path.getmtime(os.path.join(folder, name)), name[:-5]))
+                except OSError:
+                    pass
+        maps.sort(reverse=True)
+        stale = {key for _, key in maps[ATLAS_CACHE_COUNT:]}
+        for name in os.listdir(folder):
+            if name.split("-")[0].split(".")[0] in stale:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
 
 
 # =============================================================================
 # HTTP SERVER
 # =============================================================================
 
+# Spine images by content hash: /api/spines/blob/<sha256>
+BLOB_ROUTE = "/api/spines/blob/"
+
+# What's behind a content hash never changes, so it may be cached for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Many spines in one response: GET /api/spines/batch?ids=a,b,c or POST
+# /api/spines/batch with {"ids": [...]}. The response is
+# application/vnd.spines.batch, all integers big-endian:
+#
+#   4 bytes   "SPBT"
+#   1 byte    format version (1)
+#   3 bytes   zero
+#   4 bytes   number of frames (uint32), one per requested ID, in order
+#   then for each frame:
+#     2 bytes   ID length (uint16), then the ID (UTF-8)
+#     2 bytes   status (uint16): 200, or 404 if the book has no spine
+#               (or its file changed since the last scan)
+#     1 byte    content type length, then the content type (ASCII)
+#     1 byte    hash length (0 or 32), then the raw sha256 of the image
+#     4 bytes   image length (uint32), then the image bytes
+#
+# Frames that aren't 200 have an empty content type and image.
+BATCH_ROUTE = "/api/spines/batch"
+BATCH_CONTENT_TYPE = "application/vnd.spines.batch"
+BATCH_MAX_IDS = 500  # also the most spines in one atlas
+BATCH_MAX_BODY = 256 * 1024  # POST body limit, in bytes
+
+# Atlas maps (GET /api/spines/atlas?ids=a,b,c&h=300, or POST with
+# {"ids": [...], "height": 300}; no IDs means every spine) and their pages
+# (/api/spines/atlas/<key>/<page>.png). See AtlasBuilder.
+ATLAS_ROUTE = "/api/spines/atlas/"
+
+
+def route_label(path):
+    """Which endpoint a request path is, for metrics (IDs and hashes left out)."""
+    if path == "/api/spines/manifest":
+        return "manifest"
+    if path.startswith("/api/items/") and path.endswith("/spine"):
+        return "spine"
+    if path.startswith(BLOB_ROUTE):
+        return "blob"
+    if path == BATCH_ROUTE:
+        return "batch"
+    if path == ATLAS_ROUTE.rstrip("/"):
+        return "atlas"
+    if path.startswith(ATLAS_ROUTE):
+        return "atlas_page"
+    if path in ("/health", "/metrics"):
+        return path[1:]
+    return "other"
+
+
 class SpineHandler(BaseHTTPRequestHandler):
     """
-    Handles two types of requests:
+    Handles these requests:
+
+    GET /api/spines/manifest
+        Which books have spines (JSON, or ?format=ids / bloom; ?since=
+        for just the changes since a revision)
+    GET /api/items/{bookId}/spine
+        One book's spine image (?h= / ?w= for a scaled-down copy)
+    GET /api/spines/blob/{sha256}
+        A spine image by content hash, cacheable forever
+    GET or POST /api/spines/batch
+        Many spine images in one response (see BATCH_ROUTE)
+    GET or POST /api/spines/atlas, GET /api/spines/atlas/{key}/{page}.png
+        Spines packed into a few large images (see AtlasBuilder)
+    GET /health, GET /metrics
+        Status and Prometheus metrics
+
+    The manifest and spine URLs match exactly what the app expects, so
+    the app just needs to know this server's address.
+
+    Speaks HTTP/1.1 so the app can reuse one connection for many spines.
+    Every response carries a Content-Length, which keep-alive depends on.
+    """
 
-    1. GET /api/spines/manifest
-       Returns the manifest JSON (list of book IDs that have spines)
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
 
-    2. GET /api/items/{bookId}/spine
-       Returns the actual spine image file
+    # Headers and body go out as separate writes; with Nagle on, the body
+    # of a small response waits for the client's delayed ACK (~40ms) on
+    # every request after the first on a kept-alive connection
+    disable_nagle_algorithm = True
 
-    These URLs match exactly what the app expects, so the app
-    just needs to know this server's address.
-    """
+    # Current SpineSnapshot, replaced wholesale by SpineRefresher
+    _snapshot = None
 
-    # Class-level cache (shared across requests)
-    _spine_files = None
-    _manifest = None
-    _last_scan = 0
-    _scan_interval = 30  # Re-scan folder every 30 seconds
+    # SpineByteCache shared by all worker threads (None = no caching)
+    _byte_cache = None
 
-    @classmethod
-    def refresh_if_needed(cls):
-        """Re-scan the spines folder periodically to pick up new images."""
-        now = time.time()
-        if now - cls._last_scan > cls._scan_interval:
-            spines, unmatched = find_spine_files()
-            cls._spine_files = spines
-            cls._manifest = build_manifest(spines)
-            cls._last_scan = now
+    # ManifestLog for answering ?since= manifest requests
+    _manifest_log = None
+
+    # index_summary() as of the last snapshot, in --workers processes (which
+    # don't hold the book index themselves)
+    _index_summary = None
+
+    # MetricsShare summing /metrics across --workers processes
+    _metrics_share = None
+
+    # AtlasBuilder, DerivativeCache and VariantStore (None when Pillow isn't installed)
+    _atlas_builder = None
+    _derivatives = None
+    _variants = None
+
+    # Called when a file no longer matches the snapshot, to get it
+    # rescanned (SpineRefresher.request_rescan; None in --workers processes,
+    # where the refresher's own scans catch up)
+    _on_stale = None
 
     def do_GET(self):
-        self.refresh_if_needed()
+        self.timed(self.handle_get)
+
+    def do_POST(self):
+        self.timed(self.handle_post)
+
+    def timed(self, handle):
+        """Run a request handler and record its route, status, size and duration."""
+        started = time.perf_counter()
+        self._status = None
+        self._body_bytes = 0
+        try:
+            handle()
+        finally:
+            route = route_label(self.path.partition("?")[0])
+            _metrics.observe("spine_http_request_duration_seconds", time.perf_counter() - started, route=route)
+            _metrics.inc("spine_http_requests_total", route=route, status=self._status or 0)
+            if self._body_bytes:
+                _metrics.inc("spine_http_response_bytes_total", self._body_bytes, route=route)
+
+    def send_response(self, code, message=None):
+        self._status = code
+        BaseHTTPRequestHandler.send_response(self, code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == "content-length" and self._status != 304:
+            self._body_bytes = int(value)
+        BaseHTTPRequestHandler.send_header(self, keyword, value)
+
+    def handle_get(self):
+        snapshot = self._snapshot or SpineSnapshot({}, [])
 
         # Strip query params for matching (app sends ?v=1&t=123 for cache busting)
-        path = self.path.split("?")[0]
+        path, _, query = self.path.partition("?")
+        params = urllib.parse.parse_qs(query)
 
         # --- Manifest ---
         if path == "/api/spines/manifest":
-            self.send_json(self._manifest)
+            fmt = self.manifest_format(params)
+            if fmt is None:
+                self.send_json({"error": "format must be json, ids or bloom"}, status=400)
+            elif fmt != "json":
+                self.serve_compact_manifest(snapshot, fmt, params)
+            elif "since" in params:
+                self.serve_manifest_delta(snapshot, params["since"][0])
+            else:
+                self.serve_manifest(snapshot)
             return
 
         # --- Spine image ---
@@ -515,57 +3536,666 @@ class SpineHandler(BaseHTTPRequestHandler):
             parts = path.split("/")
             if len(parts) >= 4:
                 book_id = parts[3]
-                self.serve_spine_image(book_id)
+                self.serve_spine_image(snapshot, book_id, params)
                 return
 
+        # --- Spine image by content hash ---
+        # Path: /api/spines/blob/{sha256}
+        if path.startswith(BLOB_ROUTE):
+            self.serve_blob(snapshot, path[len(BLOB_ROUTE):], params)
+            return
+
+        # --- Many spine images at once ---
+        if path == BATCH_ROUTE:
+            self.serve_batch(snapshot, self.ids_param(params))
+            return
+
+        # --- Atlases ---
+        if path == ATLAS_ROUTE.rstrip("/"):
+            self.serve_atlas(snapshot, self.ids_param(params), params.get("h", [None])[0])
+            return
+        if path.startswith(ATLAS_ROUTE):
+            self.serve_atlas_page(path[len(ATLAS_ROUTE):])
+            return
+
         # --- Health check ---
         if path == "/health":
-            self.send_json({
-                "status": "ok",
-                "spines": len(self._spine_files) if self._spine_files else 0,
-                "indexed_books": len(_books_by_id),
-                "matchable_keys": len(_title_index),
-            })
+            health = {"status": "ok", "spines": len(snapshot.spine_files)}
+            health.update(self._index_summary or index_summary())
+            health["image_cache"] = self._byte_cache.stats() if self._byte_cache else None
+            self.send_json(health)
+            return
+
+        # --- Metrics (Prometheus text format) ---
+        if path == "/metrics":
+            share = self._metrics_share
+            body = (share.render() if share else _metrics.render()).encode()
+            self.send_body(200, "text/plain; version=0.0.4; charset=utf-8", body, {"Cache-Control": "no-store"})
             return
 
         # --- Not found ---
-        self.send_error(404, "Not found")
+        self.send_json({"error": "Not found"}, status=404)
+
+    def handle_post(self):
+        snapshot = self._snapshot or SpineSnapshot({}, [])
+        path = self.path.partition("?")[0]
+
+        if path in (BATCH_ROUTE, ATLAS_ROUTE.rstrip("/")):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            if not 0 < length <= BATCH_MAX_BODY:
+                self.send_json({"error": "Send a JSON body of at most 256 KB"}, status=400)
+                self.close_connection = True
+                return
+            try:
+                body = json.loads(self.rfile.read(length))
+                ids = body.get("ids", []) if path != BATCH_ROUTE else body["ids"]
+                if not all(isinstance(book_id, str) for book_id in ids):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.send_json({"error": 'Expected {"ids": ["book id", ...]}'}, status=400)
+                return
+            if path == BATCH_ROUTE:
+                self.serve_batch(snapshot, ids)
+            else:
+                self.serve_atlas(snapshot, ids, body.get("height"))
+            return
+
+        self.send_json({"error": "Not found"}, status=404)
+        self.close_connection = True
+
+    def ids_param(self, params):
+        """Book IDs from ?ids=a,b,c (the parameter may also repeat)."""
+        return [book_id for value in params.get("ids", []) for book_id in value.split(",") if book_id]
+
+    def serve_spine_image(self, snapshot, book_id, params):
+        """
+        Send back a spine image file, scaled down if ?h= or ?w= asks for it.
+
+        Small images come from (and go into) the byte cache. Anything that
+        won't be cached is streamed straight from the file with sendfile,
+        without ever holding the image in Python memory.
+        """
+        filepath = snapshot.spine_files.get(book_id)
+        if not filepath:
+            self.send_json({"error": f"No spine for book {book_id}"}, status=404)
+            return
 
-    def serve_spine_image(self, book_id):
-        """Send back a spine image file."""
-        if not self._spine_files or book_id not in self._spine_files:
-            self.send_error(404, f"No spine for book {book_id}")
+        size_spec = self.size_param(params)
+        if size_spec is None:
             return
+        stamp = snapshot.stats.get(filepath)
+        digest = snapshot.hashes.get(filepath)
+        variant = self.pick_variant(digest, size_spec)
+
+        # The app's cache busters change every launch, but the file usually
+        # hasn't: answer revalidations without sending the image again
+        validators = {"Vary": "Accept"} if self._variants else {}
+        if stamp:
+            size, mtime_ns = stamp
+            suffix = self.size_suffix(size_spec) + (f"-{variant[2]}" if variant else "")
+            validators.update({
+                "ETag": f'"{size:x}-{mtime_ns:x}{suffix}"',
+                "Last-Modified": email.utils.formatdate(mtime_ns / 1e9, usegmt=True),
+            })
+            if self.not_modified(validators["ETag"], mtime_ns / 1e9):
+                validators["Cache-Control"] = "public, max-age=604800"
+                self.send_not_modified(validators)
+                return
 
-        filepath = self._spine_files[book_id]
+        self.send_spine_file(filepath, stamp, digest, validators, size_spec, variant,
+                             snapshot.dimensions.get(digest))
+
+    def serve_blob(self, snapshot, digest, params):
+        """
+        Send a spine image by its sha256 (from the manifest's "spines"),
+        scaled down if ?h= or ?w= asks for it. The bytes behind a hash can
+        never change, so clients may cache the response forever and never
+        need to revalidate.
+        """
+        digest = digest.lower()
+        filepath = snapshot.blobs.get(digest)
+        if not filepath:
+            self.send_json({"error": f"No spine with hash {digest}"}, status=404)
+            return
 
+        size_spec = self.size_param(params)
+        if size_spec is None:
+            return
+        variant = self.pick_variant(digest, size_spec)
+        suffix = self.size_suffix(size_spec) + (f"-{variant[2]}" if variant else "")
+        headers = {"ETag": f'"{digest}{suffix}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if self._variants:
+            headers["Vary"] = "Accept"
+        if self.not_modified(headers["ETag"], None):
+            self.send_not_modified(headers)
+            return
+        self.send_spine_file(filepath, snapshot.stats.get(filepath), digest, headers, size_spec, variant,
+                             snapshot.dimensions.get(digest))
+
+    def pick_variant(self, digest, size_spec):
+        """
+        The WebP/AVIF copy to send instead of the original, if one is ready
+        and the client's Accept header takes it: (path, content_type, ext).
+        Resized requests get the original format.
+        """
+        variants = self._variants
+        if not variants or not digest or any(size_spec):
+            return None
+        return variants.lookup(digest, self.headers.get("Accept", ""))
+
+    def size_param(self, params):
+        """
+        (height, width) from ?h= and ?w=, each snapped to SPINE_HEIGHTS /
+        SPINE_WIDTHS or None if not given. Sends a 400 and returns None if
+        either isn't a number.
+        """
         try:
-            with open(filepath, "rb") as f:
-                data = f.read()
-        except IOError:
-            self.send_error(500, "Could not read spine file")
+            height = snap_size(int(params["h"][0]), SPINE_HEIGHTS) if "h" in params else None
+            width = snap_size(int(params["w"][0]), SPINE_WIDTHS) if "w" in params else None
+        except ValueError:
+            self.send_json({"error": "h and w must be numbers of pixels"}, status=400)
+            return None
+        return height, width
+
+    @staticmethod
+    def size_suffix(size_spec):
+        height, width = size_spec
+        return (f"-h{height}" if height else "") + (f"-w{width}" if width else "")
+
+    def serve_atlas(self, snapshot, ids, height):
+        """
+        Send the map of an atlas of the given books (every spine if none are
+        given) at the requested height, snapped to SPINE_HEIGHTS:
+
+          {"key": "...", "height": 300,
+           "pages": [{"url": "/api/spines/atlas/<key>/0.png", "width": 4096, "height": 3900}],
+           "sprites": {"<book id>": [page, x, y, width, height]},
+           "missing": ["<book id without a spine>"]}
+
+        If it isn't built yet, a build is queued and the answer is 202 with
+        a Retry-After; ask again later. 503 with a Retry-After when the
+        build queue is full or this atlas just failed to build, 400 for
+        more than BATCH_MAX_IDS books, 501 without Pillow.
+        """
+        builder = self._atlas_builder
+        if builder is None:
+            self.send_json({"error": "Atlases need Pillow on the server (pip install Pillow)"}, status=501)
+            return
+        try:
+            height = snap_size(int(height or SPINE_HEIGHTS[2]), SPINE_HEIGHTS)
+        except (TypeError, ValueError):
+            self.send_json({"error": "h must be a number of pixels"}, status=400)
+            return
+
+        ids = ids or snapshot.manifest["items"]
+        if len(ids) > BATCH_MAX_IDS:
+            self.send_json({"error": f"At most {BATCH_MAX_IDS} spines per atlas; pass ids"}, status=400)
+            return
+
+        members, missing = [], []
+        for book_id in ids:
+            path = snapshot.spine_files.get(book_id)
+            sha256 = snapshot.hashes.get(path) if path else None
+            if sha256:
+                members.append((book_id, path, sha256))
+            else:
+                missing.append(book_id)
+
+        key, atlas, problem = builder.request(members, height)
+        if problem is not None:
+            self.send_json(
+                {"error": problem, "key": key},
+                status=503,
+                headers={"Retry-After": "10", "Cache-Control": "no-store"},
+            )
+            return
+        if atlas is None:
+            self.send_json(
+                {"status": "building", "key": key},
+                status=202,
+                headers={"Retry-After": "2", "Cache-Control": "no-store"},
+            )
+            return
+
+        etag = f'"a-{key}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self.not_modified(etag, snapshot.created):
+            self.send_not_modified(headers)
             return
+        missing += [book_id for book_id, _, _ in members if book_id not in atlas["sprites"]]
+        self.send_json(dict(atlas, missing=missing), headers=headers)
+
+    def serve_atlas_page(self, rest):
+        """Send one atlas page image: <key>/<page>.png."""
+        key, _, page = rest.partition("/")
+        builder = self._atlas_builder
+        if builder is None or not re.fullmatch(r"[0-9a-f]{40}", key) or not re.fullmatch(r"\d+\.png", page):
+            self.send_json({"error": "Not found"}, status=404)
+            return
+
+        headers = {"ETag": f'"a-{key}-{page}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if self.not_modified(headers["ETag"], None):
+            self.send_not_modified(headers)
+            return
+        try:
+            f = open(builder.page_path(key, int(page[:-4])), "rb")
+        except OSError:
+            self.send_json({"error": "No such atlas page"}, status=404)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_image_headers("image/png", size, headers)
+            self.send_file_body(f, size)
+
+    def serve_batch(self, snapshot, ids):
+        """
+        Send the spines for a list of book IDs in one response, framed as
+        described above BATCH_ROUTE. Images go through the same byte cache
+        and sendfile path as single requests. Every size is settled up front
+        so the total length is known before anything is sent, but files too
+        big to cache are only held open while their frame streams, so a
+        batch never needs more than one file descriptor.
+        """
+        if not ids:
+            self.send_json({"error": "No book IDs given"}, status=400)
+            return
+        if len(ids) > BATCH_MAX_IDS:
+            self.send_json({"error": f"At most {BATCH_MAX_IDS} IDs per batch"}, status=400)
+            return
+
+        frames = []  # (frame header, bytes, or path of a file to stream, size)
+        for book_id in ids:
+            filepath = snapshot.spine_files.get(book_id)
+            spine = None
+            if filepath:
+                digest = snapshot.hashes.get(filepath)
+                spine = self.open_spine(filepath, snapshot.stats.get(filepath), digest)
+            if spine is None:
+                status = 404
+                content_type, digest, body, size = "", None, b"", 0
+            else:
+                status = 200
+                content_type, body, f = spine
+                if body is not None:
+                    size = len(body)
+                else:
+                    with f:
+                        size = os.fstat(f.fileno()).st_size
+                    body = filepath
+
+            raw_id = book_id.encode()
+            raw_type = content_type.encode()
+            raw_hash = bytes.fromhex(digest) if digest else b""
+            header = b"".join((
+                struct.pack(">H", len(raw_id)), raw_id,
+                struct.pack(">HB", status, len(raw_type)), raw_type,
+                struct.pack(">B", len(raw_hash)), raw_hash,
+                struct.pack(">I", size),
+            ))
+            frames.append((header, body, size))
+
+        preamble = b"SPBT" + struct.pack(">B3xI", 1, len(frames))
+        total = len(preamble) + sum(len(header) + size for header, _, size in frames)
+        self.send_response(200)
+        self.send_header("Content-Type", BATCH_CONTENT_TYPE)
+        self.send_header("Content-Length", str(total))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        self.wfile.write(preamble)
+        for header, body, size in frames:
+            self.wfile.write(header)
+            if isinstance(body, bytes):
+                self.wfile.write(body)
+                continue
+            # The promised size no longer holds if the file went away or
+            # changed since it was measured; the frame can't be completed,
+            # so the connection is closed (as send_file_body does)
+            try:
+                f = open(body, "rb")
+            except OSError:
+                self.close_connection = True
+                break
+            with f:
+                if os.fstat(f.fileno()).st_size != size:
+                    self.close_connection = True
+                    break
+                if not self.send_file_body(f, size):
+                    break
+
+    def open_spine(self, filepath, stamp, digest):
+        """
+        Get a spine image ready to send. Returns (content_type, data, None)
+        when the bytes are in memory, or (content_type, None, f) with an
+        open file to stream with sendfile.
+
+        Returns None if the file is gone or no longer what the snapshot
+        says it is (size and mtime differ from `stamp`, or the bytes from
+        `digest`), after asking for a rescan. Sending it anyway would file
+        new bytes under the old hash and validators.
+
+        Small images come from (and go into) the byte cache, keyed by
+        content hash when there is one. Anything that won't be cached is
+        left for sendfile, without ever holding it in Python memory.
+        """
+        cache = self._byte_cache
+        key, cache_stamp = (digest, None) if digest else (filepath, stamp)
+
+        cached = cache.get(key, cache_stamp) if cache and (digest or stamp) else None
+        if cached:
+            data, content_type = cached
+            return content_type, data, None
+
+        try:
+            f = open(filepath, "rb")
+        except IOError:
+            return self.stale_spine(filepath)
 
         content_type = mimetypes.guess_type(filepath)[0] or "image/png"
+        st = os.fstat(f.fileno())
+        if stamp and (st.st_size, st.st_mtime_ns) != tuple(stamp):
+            f.close()
+            return self.stale_spine(filepath)
+        if not (cache and (digest or stamp) and st.st_size <= cache.max_entry_bytes):
+            return content_type, None, f
+
+        with f:
+            data = f.read()
+        if digest and hashlib.sha256(data).hexdigest() != digest:
+            return self.stale_spine(filepath)
+        cache.put(key, cache_stamp, data, content_type)
+        return content_type, data, None
+
+    def stale_spine(self, filepath):
+        """Note that `filepath` changed since the scan and ask for a rescan. Returns None."""
+        _metrics.inc("spine_stale_files_total")
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {os.path.basename(filepath)} changed since the last scan")
+        if self._on_stale:
+            self._on_stale()
+        return None
+
+    def send_spine_file(self, filepath, stamp, digest, headers, size_spec=(None, None), variant=None,
+                        dimensions=None):
+        """
+        Send a spine image file with a 200 (see open_spine). With a
+        (height, width) in `size_spec`, sends a scaled-down copy from the
+        DerivativeCache instead when Pillow is available and the image
+        (`dimensions`, if known) is bigger than that. With a `variant` from
+        pick_variant(), sends that.
+        """
+        if variant:
+            try:
+                st = os.stat(variant[0])
+                filepath, stamp, digest = variant[0], (st.st_size, st.st_mtime_ns), None
+            except OSError:
+                pass  # deleted in the meantime; send the original
+
+        derivatives = self._derivatives
+        if derivatives and digest and any(size_spec):
+            resized = derivatives.get(filepath, digest, *size_spec, dimensions=dimensions)
+            if resized:
+                try:
+                    st = os.stat(resized)
+                    filepath, stamp, digest = resized, (st.st_size, st.st_mtime_ns), None
+                except OSError:
+                    pass  # pruned in the meantime; send the original
+
+        spine = self.open_spine(filepath, stamp, digest)
+        if spine is None:
+            self.send_json({"error": "Spine changed on disk; try again shortly"}, status=404)
+            return
+
+        content_type, data, f = spine
+        if data is not None:
+            self.send_image_headers(content_type, len(data), headers)
+            self.wfile.write(data)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_image_headers(content_type, size, headers)
+            self.send_file_body(f, size)
+
+    def serve_manifest(self, snapshot):
+        """Send the snapshot's manifest, compressed if the client accepts it."""
+        encoding = self.pick_encoding(snapshot.MANIFEST_CODINGS)
+        etag = snapshot.manifest_etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(snapshot.created, usegmt=True),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+        }
+        if self.not_modified(etag, snapshot.created):
+            self.send_not_modified(headers)
+            return
+        body, _ = snapshot.manifest_body(encoding)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        self.send_body(200, "application/json", body, headers)
+
+    def manifest_format(self, params):
+        """
+        Which manifest representation the client wants: "json", "ids" or
+        "bloom". ?format= wins over Accept; None for an unknown ?format=.
+        """
+        if "format" in params:
+            fmt = params["format"][0].lower()
+            return fmt if fmt in ("json", "ids", "bloom") else None
+        accept = self.headers.get("Accept", "")
+        if ID_SET_CONTENT_TYPE in accept:
+            return "ids"
+        if BLOOM_CONTENT_TYPE in accept:
+            return "bloom"
+        return "json"
+
+    def serve_compact_manifest(self, snapshot, fmt, params):
+        """Send the snapshot as a binary ID set or Bloom filter (see COMPACT MANIFESTS)."""
+        fp_rate = BLOOM_FP_RATE
+        if fmt == "bloom" and "fp" in params:
+            try:
+                fp_rate = float(params["fp"][0])
+            except ValueError:
+                self.send_json({"error": "fp must be a number like 0.01"}, status=400)
+                return
+            low, high = BLOOM_FP_RANGE
+            fp_rate = min(max(fp_rate, low), high)
+
+        bodies = snapshot.compact_manifest(fmt, fp_rate)
+        encoding = self.pick_encoding(bodies)
+        body, etag = bodies[encoding]
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(snapshot.created, usegmt=True),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+        }
+        if self.not_modified(etag, snapshot.created):
+            self.send_not_modified(headers)
+            return
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        content_type = ID_SET_CONTENT_TYPE if fmt == "ids" else BLOOM_CONTENT_TYPE
+        self.send_body(200, content_type, body, headers)
+
+    def serve_manifest_delta(self, snapshot, since):
+        """
+        Send only what changed since the client's revision:
+
+          {"revision": 42, "since": 40, "added": [...], "removed": [...],
+           "spines": {...}, "count": 1234}
+
+        "added" also lists books whose image was replaced; "spines" has the
+        manifest details for everything in "added".
 
+        If the log doesn't reach back that far (or `since` isn't a revision
+        this server issued), the full manifest is sent instead; clients can
+        tell by the "items" key.
+        """
+        try:
+            since = int(since)
+        except ValueError:
+            self.send_json({"error": "since must be a manifest revision number"}, status=400)
+            return
+
+        log = self._manifest_log
+        delta = log.delta(since, snapshot.revision) if log else None
+        if delta is None:
+            self.serve_manifest(snapshot)
+            return
+
+        added, removed = delta
+        self.send_json({
+            "revision": snapshot.revision,
+            "since": since,
+            "added": added,
+            "removed": removed,
+            "spines": {
+                book_id: snapshot.details[book_id] for book_id in added if book_id in snapshot.details
+            },
+            "count": len(snapshot.spine_files),
+        }, headers={"Cache-Control": "no-cache"})
+
+    def pick_encoding(self, available):
+        """
+        Choose a content coding from `available` (keys like "br", "gzip",
+        "identity") based on the request's Accept-Encoding q-values.
+        Prefers br over gzip when both are equally acceptable.
+        """
+        accepted = {}
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            coding, _, params = part.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            if coding:
+                accepted[coding.lower()] = q
+
+        best, best_q = "identity", 0.0
+        for coding in ("br", "gzip"):
+            q = accepted.get(coding, accepted.get("*", 0.0))
+            if coding in available and q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def send_image_headers(self, content_type, length, headers=None):
+        headers = headers or {}
         self.send_response(200)
         self.send_header("Content-Type", content_type)
-        self.send_header("Content-Length", str(len(data)))
-        self.send_header("Cache-Control", "public, max-age=604800")
+        self.send_header("Content-Length", str(length))
+        if "Cache-Control" not in headers:
+            self.send_header("Cache-Control", "public, max-age=604800")
         self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in headers.items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(data)
 
-    def send_json(self, data):
-        """Send a JSON response."""
-        body = json.dumps(data).encode()
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
+    def not_modified(self, etag, last_modified):
+        """
+        True if the client already has this version: its If-None-Match
+        lists our ETag, or (only when it sent no If-None-Match) its
+        If-Modified-Since is no older than `last_modified` (a timestamp, or
+        None when the response has no Last-Modified).
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if not if_modified_since or last_modified is None:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return int(last_modified) <= since
+
+    def send_not_modified(self, headers):
+        """Send a bodyless 304 carrying the same validators a 200 would have."""
+        self.send_response(304)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+    def send_file_body(self, f, size):
+        """
+        Send `size` bytes of an open file as the response body.
+
+        socket.sendfile() hands the copy to the kernel (os.sendfile) where
+        it can, and quietly falls back to read-and-send where it can't
+        (Windows, TLS sockets). If the file shrank underneath us the client
+        was promised more bytes than we have, so the connection is closed
+        and False returned.
+        """
+        self.wfile.flush()
+        sent = self.connection.sendfile(f, 0, size)
+        if sent < size:
+            self.close_connection = True
+            return False
+        return True
+
+    def send_json(self, data, status=200, headers=None):
+        """
+        Send a JSON response.
+
+        Used for errors too: send_error() closes the connection, which would
+        throw away the keep-alive socket on every missing spine.
+        """
+        self.send_body(status, "application/json", json.dumps(data).encode(), headers)
+
+    def send_body(self, status, content_type, body, headers=None):
+        """Send a complete response from bytes already in memory."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(body)))
         self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(body)
 
+    def handle(self):
+        """
+        Serve requests on one connection until the client closes it.
+
+        Between requests the connection waits at most KEEPALIVE_TIMEOUT, and
+        not at all when other connections are queued for a pool thread, so a
+        handful of idle clients can't hold every worker.
+        """
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """Wait while the connection is idle. Returns False to close it."""
+        deadline = time.monotonic() + KEEPALIVE_TIMEOUT
+        try:
+            # A pipelined request may already sit in the read buffer
+            self.connection.settimeout(0)
+            if self.rfile.peek(1):
+                return True
+            while True:
+                wait = min(KEEPALIVE_POLL, deadline - time.monotonic())
+                if wait <= 0 or self.server.has_waiting():
+                    return False
+                readable, _, _ = select.select([self.connection], [], [], wait)
+                if readable:
+                    return True
+        except (OSError, ValueError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def log_message(self, format, *args):
         """Quieter logging - only show errors and spine requests."""
         msg = format % args
@@ -573,6 +4203,370 @@ class SpineHandler(BaseHTTPRequestHandler):
             print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
 
 
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands accepted connections to a fixed pool of threads.
+
+    The accept loop only queues sockets; workers run the handler, which may
+    serve many requests per connection thanks to keep-alive. The queue is
+    bounded, so under overload the accept loop blocks and new connections
+    wait in the kernel backlog instead of piling up in memory.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS, reuse_port=False):
+        self._requests = queue.Queue(maxsize=threads * 4)
+        self._workers = []
+        self.reuse_port = reuse_port
+        HTTPServer.__init__(self, server_address, handler_class)
+
+        for i in range(threads):
+            worker = threading.Thread(target=self._work, name=f"spine-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def server_bind(self):
+        # With SO_REUSEPORT several processes listen on the same port and
+        # the kernel spreads new connections across them
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        HTTPServer.server_bind(self)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker instead of handling it inline."""
+        self._requests.put((request, client_address))
+
+    def has_waiting(self):
+        """True when accepted connections are queued for a free worker."""
+        return not self._requests.empty()
+
+    def _work(self):
+        while True:
+            job = self._requests.get()
+            if job is None:
+                return
+            request, client_address = job
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        for _ in self._workers:
+            self._requests.put(None)
+
+
+# =============================================================================
+# MULTI-PROCESS SERVING
+# =============================================================================
+#
+# With --workers N the server runs as N+2 processes. A supervisor forks the
+# rest and restarts any that die; it stays single-threaded, so forking is
+# always safe. A refresher process does everything the normal server does
+# apart from answering requests (index, scans, watching, ABS sync, variants)
+# and writes each new snapshot to the cache folder. N worker processes
+# listen on the same port with SO_REUSEPORT, each with its own read-only
+# copy of the latest snapshot, so requests are spread across cores instead
+# of sharing one GIL.
+
+# Seconds between workers checking the generation file for a new snapshot
+WORKER_POLL_INTERVAL = 0.5
+
+
+class SnapshotExchange:
+    """
+    Hands snapshots from the refresher process to the workers through two
+    files in the cache folder: the snapshot itself, and a tiny generation
+    file that's rewritten after it. Workers only stat and read the small
+    one until it changes.
+
+    Both carry the supervisor's run ID, so workers never serve a snapshot
+    left over from an earlier run.
+    """
+
+    STATE_FILENAME = "snapshot-state.json"
+    GENERATION_FILENAME = "snapshot-generation.json"
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.generation = 0
+        self.state_path = cache_path(self.STATE_FILENAME)
+        self.generation_path = cache_path(self.GENERATION_FILENAME)
+
+    def write(self, snapshot):
+        """Refresher side: publish a snapshot to the workers."""
+        self.generation += 1
+        log = SpineHandler._manifest_log
+        write_json_atomic(self.state_path, {
+            "run": self.run_id,
+            "generation": self.generation,
+            "spine_files": snapshot.spine_files,
+            "unmatched": snapshot.unmatched,
+            "stats": [[path, size, mtime_ns] for path, (size, mtime_ns) in snapshot.stats.items()],
+            "items": snapshot.manifest["items"],
+            "revision": snapshot.revision,
+            "details": snapshot.details,
+            "created": snapshot.created,
+            "manifest_log": log.export() if log else None,
+            "index": index_summary(),
+        })
+        write_json_atomic(self.generation_path, {"run": self.run_id, "generation": self.generation})
+
+    def read_generation(self):
+        """Worker side: the generation on disk for this run, or None."""
+        try:
+            with open(self.generation_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data.get("generation") if data.get("run") == self.run_id else None
+
+    def load(self):
+        """
+        Worker side: install the snapshot on disk into SpineHandler.
+        Returns its generation, or None if there isn't one for this run yet.
+        """
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("run") != self.run_id:
+            return None
+
+        stats = {path: (size, mtime_ns) for path, size, mtime_ns in state["stats"]}
+        snapshot = SpineSnapshot(
+            state["spine_files"], state["unmatched"], stats,
+            state["items"], state["revision"], state["details"], state["created"],
+        )
+        if state["manifest_log"]:
+            SpineHandler._manifest_log = ManifestLog.restore(state["manifest_log"])
+        SpineHandler._index_summary = state["index"]
+        SpineHandler._snapshot = snapshot
+        return state["generation"]
+
+    def follow(self):
+        """Worker side: wait for the first snapshot, then keep loading new ones in the background."""
+        generation = None
+        while generation is None:
+            generation = self.load()
+            if generation is None:
+                time.sleep(WORKER_POLL_INTERVAL)
+
+        def run():
+            current = generation
+            variants = SpineHandler._variants
+            variants_mtime = None
+            while True:
+                time.sleep(WORKER_POLL_INTERVAL)
+                try:
+                    on_disk = self.read_generation()
+                    if on_disk is not None and on_disk != current:
+                        current = self.load() or current
+                    if variants:
+                        mtime = os.stat(variants.folder).st_mtime_ns
+                        if mtime != variants_mtime:
+                            variants.reload()
+                            variants_mtime = mtime
+                except Exception as e:
+                    print(f"[worker {os.getpid()}] Could not load snapshot: {e}")
+
+        threading.Thread(target=run, name="snapshot-follower", daemon=True).start()
+
+
+# Seconds between each --workers process saving its metrics for /metrics
+METRICS_SHARE_INTERVAL = 5
+
+
+class MetricsShare:
+    """
+    Makes /metrics under --workers report the whole server, not whichever
+    process SO_REUSEPORT happened to pick for the scrape.
+
+    Every process (the refresher and each worker) saves its samples to
+    metrics-<role>.json in the cache folder every few seconds. The worker
+    answering a scrape saves its own first, then sums all the files of
+    this run. Each file only ever grows, so the summed counters never go
+    backwards between scrapes; a process that replaces a crashed one
+    carries on from its predecessor's file, so a restart doesn't look
+    like a counter reset either. Gauges are summed too: the ones workers
+    set (byte cache size) add up, the rest only the refresher sets.
+    """
+
+    def __init__(self, run_id, role):
+        self.run_id = run_id
+        self.role = role
+        self.path = cache_path(f"metrics-{role}.json")
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Pick up where this role's previous process left off, then save every few seconds."""
+        previous = self._read(self.path)
+        if previous is not None:
+            _metrics.continue_from(previous)
+
+        def run():
+            while True:
+                time.sleep(METRICS_SHARE_INTERVAL)
+                self.save()
+
+        threading.Thread(target=run, name="metrics-share", daemon=True).start()
+        return self
+
+    def save(self):
+        data = _metrics.export()
+        data["run"] = self.run_id
+        with self._lock:
+            try:
+                write_json_atomic(self.path, data)
+            except OSError as e:
+                print(f"Could not save metrics: {e}")
+
+    def render(self):
+        """The sum of every process's metrics, as exposition-format text."""
+        self.save()
+        total = Metrics()
+        total._kinds = _metrics._kinds
+        folder = os.path.dirname(self.path)
+        for name in os.listdir(folder):
+            if name.startswith("metrics-") and name.endswith(".json"):
+                data = self._read(os.path.join(folder, name))
+                if data is not None:
+                    total.add(data)
+        return total.render()
+
+    def _read(self, path):
+        """A metrics file saved during this run, or None."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if data.get("run") == self.run_id else None
+
+
+def serve_worker(port, threads, cache_mb, exchange):
+    """Body of a --workers process: serve requests from the refresher's snapshots."""
+    SpineHandler._byte_cache = SpineByteCache(cache_mb * 1024 * 1024) if cache_mb > 0 else None
+    SpineHandler._manifest_log = ManifestLog()
+    register_metrics_collectors(index=False)
+    if Image is not None:
+        SpineHandler._atlas_builder = AtlasBuilder()
+        SpineHandler._derivatives = DerivativeCache(DERIVATIVE_CACHE_MB * 1024 * 1024)
+    if variant_formats():
+        SpineHandler._variants = VariantStore()  # lookups only; the refresher encodes
+
+    exchange.follow()
+    server = PooledHTTPServer(("0.0.0.0", port), SpineHandler, threads=max(1, threads), reuse_port=True)
+    server.serve_forever()
+
+
+# Signals that stop the --workers supervisor and its children (Ctrl+C aside)
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGHUP)
+
+# Seconds children get to exit after SIGTERM before they're killed
+STOP_TIMEOUT = 5
+
+
+def stop_children(children):
+    """SIGTERM every pid in `children` (pid → role), wait for them, SIGKILL stragglers."""
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    deadline = time.monotonic() + STOP_TIMEOUT
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.pop(pid, None)
+        elif time.monotonic() < deadline:
+            time.sleep(0.05)
+        else:
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+                children.pop(pid, None)
+
+
+def run_prefork(port, workers, threads, cache_mb, start_service):
+    """
+    Supervisor for --workers: fork the refresher process (which runs
+    start_service(on_publish)) and `workers` serving processes, restart
+    any that exit, and stop them all on Ctrl+C, SIGTERM or SIGHUP. Children
+    get SIGTERM and a few seconds to exit, then SIGKILL, and are reaped
+    before the supervisor exits, so none is left serving on the port.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("ERROR: --workers needs SO_REUSEPORT (Linux, macOS or BSD).")
+        sys.exit(1)
+
+    exchange = SnapshotExchange(f"{os.getpid()}-{time.time():.0f}")
+    children = {}  # pid → role
+
+    def spawn(role):
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid:
+            children[pid] = role
+            return
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        code = 0
+        try:
+            share = MetricsShare(exchange.run_id, role).start()
+            if role == "refresher":
+                start_service(exchange.write)
+                threading.Event().wait()
+            else:
+                SpineHandler._metrics_share = share
+                serve_worker(port, threads, cache_mb // workers, exchange)
+        except KeyboardInterrupt:
+            pass
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, stop)
+
+    try:
+        spawn("refresher")
+        for n in range(1, workers + 1):
+            spawn(f"worker-{n}")
+
+        while True:
+            pid, status = os.wait()
+            role = children.pop(pid, None)
+            if role:
+                print(f"The {role} process ({pid}) stopped; starting a new one.")
+                time.sleep(1)
+                spawn(role)
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        for signum in STOP_SIGNALS + (signal.SIGINT,):
+            signal.signal(signum, signal.SIG_IGN)
+        stop_children(children)
+
+
 # =============================================================================
 # CLI COMMANDS
 # =============================================================================
@@ -623,18 +4617,170 @@ def cmd_scan_library():
         print("Start the server to serve them: python3 spine_server.py")
 
 
-def cmd_serve(port):
+def cmd_make_variants():
+    """Make WebP/AVIF copies of every spine image now, instead of in the background while serving."""
+    ensure_spines_dir()
+    store = VariantStore()
+    if not store.formats:
+        print("Pillow with WebP or AVIF support is needed (pip install Pillow).")
+        return
+
+    info_cache = SpineInfoCache(cache_path(SpineInfoCache.FILENAME)).load()
+    blobs = {}
+    filenames = []
+    for filename in sorted(os.listdir(SPINES_DIR)):
+        st = stat_spine_file(filename)
+        if st is None:
+            continue
+        filenames.append(filename)
+        path = os.path.join(SPINES_DIR, filename)
+        info = info_cache.describe(path, (st.st_size, st.st_mtime_ns))
+        if info is not None:
+            blobs.setdefault(info["sha256"], path)
+    info_cache.retain(filenames)
+    info_cache.save()
+
+    futures = store.schedule(blobs)
+    print(f"Encoding {len(futures)} copies ({', '.join(store.formats)}) of {len(blobs)} images "
+          f"with {store.workers} processes...")
+    started = time.time()
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            pass  # reported by VariantStore
+    made = sum(len(exts) for exts in store._available.values())
+    print(f"Done in {time.time() - started:.1f}s. {made} copies in {store.folder}")
+
+
+def register_metrics_collectors(match_cache=None, index=True):
+    """Have /metrics report the byte cache, match cache and index as they are when scraped."""
+    def collect():
+        byte_cache = SpineHandler._byte_cache
+        if byte_cache:
+            stats = byte_cache.stats()
+            _metrics.set("spine_image_cache_hits_total", stats["hits"])
+            _metrics.set("spine_image_cache_misses_total", stats["misses"])
+            _metrics.set("spine_image_cache_bytes", stats["bytes"])
+            _metrics.set("spine_image_cache_entries", stats["entries"])
+        if match_cache:
+            _metrics.set("spine_match_cache_hits_total", match_cache.hits)
+            _metrics.set("spine_match_cache_misses_total", match_cache.misses)
+        if index:
+            snapshot = SpineHandler._snapshot
+            if snapshot is not None:
+                _metrics.set("spine_spines", len(snapshot.spine_files))
+            _metrics.set("spine_index_books", len(_books_by_id))
+            _metrics.set("spine_index_keys", len(_title_index))
+
+    _metrics.collect(collect)
+
+
+def cmd_serve(port, threads=DEFAULT_THREADS, scan_interval=SCAN_INTERVAL, watch="auto",
+              sync_interval=SYNC_INTERVAL, cache_mb=CACHE_MB, workers=1, profile=None):
     """Start the HTTP server."""
     ensure_spines_dir()
+    cache_folder()
+
+    def start_service(on_publish=None):
+        start_spine_service(port, threads, scan_interval, watch, sync_interval,
+                            cache_mb if on_publish is None else 0, workers, on_publish, profile)
+
+    if workers > 1:
+        run_prefork(port, workers, threads, cache_mb, start_service)
+        return
+
+    start_service()
+    if threads > 0:
+        server = PooledHTTPServer(("0.0.0.0", port), SpineHandler, threads=threads)
+    else:
+        # One connection at a time: an idle keep-alive client would block
+        # everyone else, so answer as HTTP/1.0 and close after each response
+        SpineHandler.protocol_version = "HTTP/1.0"
+        server = HTTPServer(("0.0.0.0", port), SpineHandler)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+        server.server_close()
 
-    # Build the title matching index from ABS
-    load_book_index()
 
-    # Do initial scan and match
-    spine_files, unmatched = find_spine_files()
-    SpineHandler._spine_files = spine_files
-    SpineHandler._manifest = build_manifest(spine_files)
-    SpineHandler._last_scan = time.time()
+def start_spine_service(port, threads, scan_interval, watch, sync_interval, cache_mb, workers,
+                        on_publish=None, profile=None):
+    """
+    Load the index, scan the spines folder, start the background refresh,
+    watching and syncing, and print the startup summary. Everything but
+    the HTTP listener itself.
+
+    With `profile` set (see --profile), the loading phases are timed and
+    reported, and a non-empty `profile` is a file to dump cProfile stats
+    of the startup into.
+    """
+    started = time.perf_counter()
+    profiler = None
+    if profile is not None:
+        _phases.enabled = True
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    match_cache = MatchCache(cache_path(MatchCache.FILENAME)).load()
+    byte_cache = SpineByteCache(cache_mb * 1024 * 1024) if cache_mb > 0 else None
+    SpineHandler._byte_cache = byte_cache
+    register_metrics_collectors(match_cache=match_cache)
+    manifest_log = ManifestLog(cache_path(ManifestLog.FILENAME))
+    SpineHandler._manifest_log = manifest_log
+    SpineHandler._atlas_builder = AtlasBuilder() if Image is not None else None
+    SpineHandler._derivatives = DerivativeCache(DERIVATIVE_CACHE_MB * 1024 * 1024) if Image is not None else None
+    variants = VariantStore() if variant_formats() else None
+    if variants is not None and not variants.formats:
+        variants = None  # its folder is unusable
+    SpineHandler._variants = variants
+    refresher = SpineRefresher(
+        interval=scan_interval,
+        match_cache=match_cache,
+        byte_cache=byte_cache,
+        manifest_log=manifest_log,
+        info_cache=SpineInfoCache(cache_path(SpineInfoCache.FILENAME)).load(),
+        variants=variants,
+        on_publish=on_publish,
+    )
+    SpineHandler._on_stale = refresher.request_rescan
+
+    # Build the title matching index (from the saved snapshot if there is
+    # one, then brought up to date from ABS in the background)
+    syncing = bool(ABS_API_KEY) and sync_interval > 0
+    from_snapshot = load_book_index(
+        on_refresh=refresher.request_rescan, refresh_in_background=not syncing
+    )
+
+    # Do initial scan and match, then keep the folder fresh in the background:
+    # inotify for instant, incremental updates where we can, polling otherwise
+    snapshot = refresher.refresh()
+    spine_files, unmatched = snapshot.spine_files, snapshot.unmatched
+    if match_cache.hits:
+        print(f"Reused {match_cache.hits} cached match decisions ({match_cache.misses} files matched fresh)")
+
+    if profiler:
+        profiler.disable()
+        try:
+            profiler.dump_stats(profile)
+            print(f"Saved cProfile stats of startup to {profile} (view with: python3 -m pstats {profile})")
+        except OSError as e:
+            print(f"Could not save cProfile stats: {e}")
+    if _phases.enabled:
+        report_profile("startup", time.perf_counter() - started)
+
+    watching = False
+    if watch != "poll":
+        watching = FolderWatcher(refresher).start()
+        if not watching and watch == "inotify":
+            print("WARNING: inotify is not available here. Falling back to polling.")
+    refresher.start()
+
+    if syncing:
+        CatalogSync(refresher, interval=sync_interval).start(immediately=from_snapshot)
 
     print()
     print("=== Spine Server ===")
@@ -666,8 +4812,17 @@ def cmd_serve(port):
         print(f"  Run with --list-books to see your books")
         print()
 
-    print(f"Spines folder: {SPINES_DIR}")
+    if watching:
+        print(f"Spines folder: {SPINES_DIR} (watched for changes)")
+    else:
+        print(f"Spines folder: {SPINES_DIR} (re-scanned every {scan_interval}s)")
     print(f"Server running at: http://0.0.0.0:{port}")
+    if workers > 1:
+        print(f"Worker processes: {workers} (SO_REUSEPORT), {max(1, threads)} threads each")
+    elif threads > 0:
+        print(f"Worker threads: {threads} (HTTP/1.1 keep-alive)")
+    else:
+        print("Worker threads: none (single-threaded, no keep-alive)")
     print()
     print("--- App Setup ---")
     print("In the app, go to:")
@@ -676,18 +4831,16 @@ def cmd_serve(port):
     print()
     print("--- Endpoints ---")
     print("  GET /api/spines/manifest      - List of books with spines")
-    print("  GET /api/items/{id}/spine      - Get a spine image")
+    print("  GET /api/spines/manifest?since=REV - Changes since a manifest revision")
+    print("  GET /api/spines/manifest?format=ids|bloom - Compact binary manifest")
+    print("  GET /api/items/{id}/spine      - Get a spine image (?h=300 to scale it down)")
+    print("  GET /api/spines/blob/{sha256}  - Get a spine image by content hash")
+    print("  GET /api/spines/batch?ids=A,B  - Get many spine images in one response")
+    print("  GET /api/spines/atlas?ids=A,B&h=300 - Spine atlas map (needs Pillow)")
     print("  GET /health                    - Server status")
+    print("  GET /metrics                   - Prometheus metrics")
     print()
 
-    server = HTTPServer(("0.0.0.0", port), SpineHandler)
-
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\nShutting down.")
-        server.server_close()
-
 
 # =============================================================================
 # MAIN
@@ -698,6 +4851,11 @@ def _override_spines_dir(new_dir):
     SPINES_DIR = new_dir
 
 
+def _override_cache_dir(new_dir):
+    global CACHE_DIR
+    CACHE_DIR = new_dir
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Spine Server for AudiobookShelf",
@@ -727,6 +4885,15 @@ Examples:
 
   # Use a different port:
   python3 spine_server.py --port 9000
+
+  # Handle more simultaneous connections:
+  python3 spine_server.py --threads 32
+
+  # Use several CPU cores (Linux/BSD):
+  python3 spine_server.py --workers 4
+
+  # Find out where startup time goes:
+  python3 spine_server.py --profile startup.pstats
         """,
     )
 
@@ -740,12 +4907,71 @@ Examples:
         action="store_true",
         help="Scan your ABS library folders for existing spine.png/jpg files",
     )
+    parser.add_argument(
+        "--make-variants",
+        action="store_true",
+        help="Make WebP/AVIF copies of all spine images now and exit (needs Pillow)",
+    )
     parser.add_argument(
         "--port",
         type=int,
         default=int(os.environ.get("PORT", DEFAULT_PORT)),
         help=f"Port to listen on (default: {DEFAULT_PORT})",
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.environ.get("THREADS", DEFAULT_THREADS)),
+        help=f"Worker threads for concurrent requests, 0 = single-threaded (default: {DEFAULT_THREADS})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WORKERS", 1)),
+        help="Serving processes sharing the port via SO_REUSEPORT, each with --threads threads "
+             "(default: 1, a single process)",
+    )
+    parser.add_argument(
+        "--scan-interval",
+        type=int,
+        default=int(os.environ.get("SCAN_INTERVAL", SCAN_INTERVAL)),
+        help=f"Seconds between background re-scans of the spines folder (default: {SCAN_INTERVAL})",
+    )
+    parser.add_argument(
+        "--watch",
+        choices=["auto", "inotify", "poll"],
+        default=os.environ.get("WATCH", "auto"),
+        help="How to notice new spine files: inotify (Linux, instant), poll "
+             "(re-scan every --scan-interval), or auto (inotify if available)",
+    )
+    parser.add_argument(
+        "--sync-interval",
+        type=int,
+        default=int(os.environ.get("SYNC_INTERVAL", SYNC_INTERVAL)),
+        help=f"Seconds between syncing new/changed/removed books from ABS, 0 = off (default: {SYNC_INTERVAL})",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=int(os.environ.get("CACHE_MB", CACHE_MB)),
+        help=f"Memory for caching spine images, in MB, 0 = off (default: {CACHE_MB})",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=os.environ.get("PROFILE"),
+        metavar="PSTATS_FILE",
+        help="Time index loading and matching phases at startup and on every rescan, "
+             "log the slowest filenames and save a report to the cache folder; "
+             "with a file name, also dump cProfile stats of the startup there",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=CACHE_DIR,
+        help="Folder for the server's cache files (default: SPINES_DIR/.spine-cache)",
+    )
     parser.add_argument(
         "--spines-dir",
         type=str,
@@ -758,13 +4984,26 @@ Examples:
     # Override spines dir if specified
     if args.spines_dir != SPINES_DIR:
         _override_spines_dir(args.spines_dir)
+    if args.cache_dir != CACHE_DIR:
+        _override_cache_dir(args.cache_dir)
 
     if args.list_books:
         cmd_list_books()
     elif args.scan_library:
         cmd_scan_library()
+    elif args.make_variants:
+        cmd_make_variants()
     else:
-        cmd_serve(args.port)
+        cmd_serve(
+            args.port,
+            threads=args.threads,
+            scan_interval=args.scan_interval,
+            watch=args.watch,
+            sync_interval=args.sync_interval,
+            cache_mb=args.cache_mb,
+            workers=args.workers,
+            profile=args.profile,
+        )
 
 
 if __name__ == "__main__":
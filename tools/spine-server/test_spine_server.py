@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Tests for spine_server.py.
+
+Standard library only, like the server itself. Run from this folder with:
+
+  python3 -m unittest test_spine_server
+
+(pytest picks them up too.) Tests that need Pillow are skipped without it.
+"""
+
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+
+import spine_server as server
+
+
+def reference_edit_distance(a, b):
+    """Textbook dynamic-programming Levenshtein distance."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def random_title(rng, words):
+    return " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+
+
+def misspell(rng, text, edits):
+    """`text` with up to `edits` random insertions, deletions and substitutions."""
+    letters = "abcdefghijklmnopqrstuvwxyz "
+    for _ in range(edits):
+        pos = rng.randrange(len(text) + 1)
+        kind = rng.randrange(3)
+        if kind == 0:
+            text = text[:pos] + rng.choice(letters) + text[pos:]
+        elif kind == 1 and pos < len(text):
+            text = text[:pos] + text[pos + 1:]
+        elif pos < len(text):
+            text = text[:pos] + rng.choice(letters) + text[pos + 1:]
+    return text
+
+
+WORDS = ["dune", "galaxy", "guide", "hobbit", "foundation", "empire", "night", "circus",
+         "station", "eleven", "red", "rising", "the", "of", "to", "and", "king", "way"]
+
+
+class EditDistanceTest(unittest.TestCase):
+
+    def test_edge_cases(self):
+        self.assertEqual(server.edit_distance("", ""), 0)
+        self.assertEqual(server.edit_distance("", "abc"), 3)
+        self.assertEqual(server.edit_distance("abc", ""), 3)
+        self.assertEqual(server.edit_distance("kitten", "sitting"), 3)
+        self.assertEqual(server.edit_distance("flaw", "lawn"), 2)
+
+    def test_matches_reference(self):
+        rng = random.Random(1)
+        alphabet = "abcde é"
+        for _ in range(2000):
+            a = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            b = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            self.assertEqual(server.edit_distance(a, b), reference_edit_distance(a, b), (a, b))
+
+    def test_long_strings(self):
+        # Longer than a machine word, so the bit vectors span several words
+        rng = random.Random(2)
+        for _ in range(50):
+            a = "".join(rng.choice("abc") for _ in range(rng.randint(60, 150)))
+            b = misspell(rng, a, rng.randint(0, 10))
+            self.assertEqual(server.edit_distance(a, b), reference_edit_distance(a, b))
+
+
+class FuzzyIndexTest(unittest.TestCase):
+
+    def build(self, rng, count):
+        title_index = {}
+        for i in range(count):
+            title_index.setdefault(random_title(rng, WORDS), f"li_{i:04d}")
+        return title_index, server.FuzzyIndex(title_index)
+
+    def brute_force_containment(self, nf, title_index):
+        """The linear scan step 4 of match_filename_to_book used to do."""
+        best_len, best_id = 0, None
+        for key, book_id in title_index.items():
+            if len(key) < server.FUZZY_MIN_LENGTH or len(nf) < server.FUZZY_MIN_LENGTH:
+                continue
+            if nf in key or key in nf:
+                overlap = min(len(nf), len(key))
+                if overlap > best_len:
+                    best_len, best_id = overlap, book_id
+        return best_id
+
+    def brute_force_closest(self, nf, distances, max_distance):
+        """`distances` is [(key, book_id, edit distance to nf)] for every key."""
+        if max_distance <= 0 or len(nf) < 3 * (max_distance + 1):
+            return None, None
+        best_distance, best_ids = None, set()
+        for key, book_id, distance in distances:
+            if len(key) < server.FUZZY_MIN_LENGTH or distance > max_distance:
+                continue
+            if best_distance is None or distance < best_distance:
+                best_distance, best_ids = distance, {book_id}
+            elif distance == best_distance:
+                best_ids.add(book_id)
+        if len(best_ids) != 1:
+            return None, None
+        return best_ids.pop(), best_distance
+
+    def test_containment_matches_linear_scan(self):
+        rng = random.Random(3)
+        title_index, index = self.build(rng, 300)
+        keys = list(title_index)
+        for _ in range(1000):
+            key = rng.choice(keys)
+            start = rng.randrange(len(key))
+            queries = [
+                key[start:start + rng.randint(3, 20)],               # part of a key
+                f"{random_title(rng, WORDS)} {key}",                 # key plus extra words
+                random_title(rng, WORDS),                            # anything
+            ]
+            for nf in queries:
+                self.assertEqual(index.best_match(nf), self.brute_force_containment(nf, title_index), nf)
+
+    def test_typos_match_brute_force(self):
+        rng = random.Random(4)
+        title_index, index = self.build(rng, 150)
+        keys = list(title_index)
+        for _ in range(300):
+            nf = misspell(rng, rng.choice(keys), rng.randint(0, 3))
+            distances = [(key, book_id, reference_edit_distance(nf, key)) for key, book_id in title_index.items()]
+            for max_distance in (1, 2):
+                self.assertEqual(
+                    index.closest(nf, max_distance),
+                    self.brute_force_closest(nf, distances, max_distance),
+                    (nf, max_distance),
+                )
+
+    def test_discard_and_compaction_keep_answers(self):
+        rng = random.Random(5)
+        title_index, index = self.build(rng, 200)
+        for key in list(title_index)[::2]:
+            index.discard(key)
+            del title_index[key]
+        compacted = index.compacted()
+        self.assertEqual(len(compacted), len(index))
+        for _ in range(300):
+            nf = misspell(rng, random_title(rng, WORDS), 1)
+            expected = self.brute_force_containment(nf, title_index)
+            self.assertEqual(index.best_match(nf), expected, nf)
+            self.assertEqual(compacted.best_match(nf), expected, nf)
+            self.assertEqual(compacted.closest(nf, 2), index.closest(nf, 2), nf)
+
+
+class ManifestLogTest(unittest.TestCase):
+
+    def simulate(self, rng, steps):
+        """
+        Record random changes in a ManifestLog, keeping the full state
+        (book ID → image version) at every revision to check against.
+        """
+        log = server.ManifestLog()
+        state = {f"li_{i:03d}": 0 for i in range(20)}
+        states = {log.record(sorted(state), ()): dict(state)}
+        versions = dict(state)  # never reset, so a re-added ID reads as changed
+        next_id = 20
+        for _ in range(steps):
+            added, removed, replaced = [], [], []
+            for _ in range(rng.randint(1, 4)):
+                kind = rng.randrange(3)
+                book_id = rng.choice(sorted(state)) if state else None
+                if kind == 0 or book_id is None or book_id in added + removed + replaced:
+                    # Sometimes bring back an ID removed earlier
+                    book_id = f"li_{rng.randrange(next_id + 1):03d}"
+                    if book_id in state or book_id in removed:
+                        continue
+                    next_id += 1
+                    versions[book_id] = versions.get(book_id, 0) + 1
+                    state[book_id] = versions[book_id]
+                    added.append(book_id)
+                elif kind == 1:
+                    del state[book_id]
+                    removed.append(book_id)
+                else:
+                    versions[book_id] += 1
+                    state[book_id] = versions[book_id]
+                    replaced.append(book_id)
+            states[log.record(added, removed, replaced)] = dict(state)
+        return log, states
+
+    def expected_delta(self, before, after):
+        added = sorted(b for b, version in after.items() if before.get(b) != version)
+        removed = sorted(b for b in before if b not in after)
+        return added, removed
+
+    def test_delta_is_net_of_every_revision_between(self):
+        rng = random.Random(6)
+        log, states = self.simulate(rng, 60)
+        revisions = sorted(states)
+        for since in revisions:
+            for until in revisions:
+                if since > until:
+                    self.assertIsNone(log.delta(since, until))
+                    continue
+                self.assertEqual(
+                    log.delta(since, until),
+                    self.expected_delta(states[since], states[until]),
+                    (since, until),
+                )
+
+    def test_add_then_remove_is_not_mentioned(self):
+        log = server.ManifestLog()
+        base = log.record(["li_a"], ())
+        log.record(["li_b"], ())
+        until = log.record((), ["li_b"])
+        self.assertEqual(log.delta(base, until), ([], []))
+
+    def test_remove_then_add_is_a_refetch(self):
+        log = server.ManifestLog()
+        base = log.record(["li_a"], ())
+        log.record((), ["li_a"])
+        until = log.record(["li_a"], ())
+        self.assertEqual(log.delta(base, until), (["li_a"], []))
+
+    def test_unknown_revisions(self):
+        log = server.ManifestLog()
+        self.assertIsNone(log.delta(0, 0))
+        base = log.record(["li_a"], ())
+        self.assertIsNone(log.delta(base - 1, base))
+        self.assertEqual(log.delta(base, base), ([], []))
+
+    def test_export_restore(self):
+        rng = random.Random(7)
+        log, states = self.simulate(rng, 20)
+        copy = server.ManifestLog.restore(log.export())
+        revisions = sorted(states)
+        for since in revisions:
+            self.assertEqual(copy.delta(since, revisions[-1]), log.delta(since, revisions[-1]))
+
+
+def decode_id_set(data):
+    """Decode an "SPID" body, written from the format description alone."""
+    assert data[:4] == b"SPID"
+    version, revision, count = struct.unpack(">B3xII", data[4:16])
+    assert version == 1
+    pos = 16
+
+    def varint():
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    ids, previous = [], b""
+    for _ in range(count):
+        shared = varint()
+        rest = varint()
+        current = previous[:shared] + data[pos:pos + rest]
+        pos += rest
+        ids.append(current.decode())
+        previous = current
+    assert pos == len(data)
+    return revision, ids
+
+
+def bloom_contains(data, book_id):
+    """Membership test on an "SPBF" body, written from the format description alone."""
+    assert data[:4] == b"SPBF"
+    version, k, revision, count, m = struct.unpack(">BBxxIII", data[4:20])
+    bits = data[20:]
+    h1 = 0x811c9dc5
+    for byte in book_id.encode():
+        h1 = ((h1 ^ byte) * 0x01000193) & 0xFFFFFFFF
+    h2 = h1 ^ (h1 >> 16)
+    h2 = (h2 * 0x85ebca6b) & 0xFFFFFFFF
+    h2 ^= h2 >> 13
+    h2 = (h2 * 0xc2b2ae35) & 0xFFFFFFFF
+    h2 ^= h2 >> 16
+    for i in range(k):
+        bit = (h1 + i * h2) % m
+        if not (bits[bit >> 3] >> (bit & 7)) & 1:
+            return False
+    return True
+
+
+class CompactManifestTest(unittest.TestCase):
+
+    def ids(self, count, seed):
+        rng = random.Random(seed)
+        ids = {f"li_{rng.getrandbits(64):016x}" for _ in range(count)}
+        ids.update(["li_é", "li_€x", "li_", "x"])
+        return sorted(ids, key=lambda book_id: book_id.encode())
+
+    def test_id_set_round_trip(self):
+        for ids in ([], ["li_a"], self.ids(1000, 1)):
+            self.assertEqual(decode_id_set(server.encode_id_set(ids, 42)), (42, ids))
+
+    def test_id_set_shares_prefixes(self):
+        ids = [f"li_{i:010d}" for i in range(1000)]
+        body = server.encode_id_set(ids, 1)
+        self.assertEqual(decode_id_set(body), (1, ids))
+        self.assertLess(len(body), len("".join(ids)) // 2)
+
+    def test_bloom_has_every_member(self):
+        ids = self.ids(2000, 8)
+        body = server.encode_bloom_filter(ids, 7, 0.01)
+        version, k, revision, count, m = struct.unpack(">BBxxIII", body[4:20])
+        self.assertEqual((version, revision, count), (1, 7, len(ids)))
+        self.assertEqual(len(body), 20 + m // 8)
+        self.assertTrue(all(bloom_contains(body, book_id) for book_id in ids))
+
+    def test_bloom_false_positive_rate(self):
+        ids = self.ids(5000, 9)
+        for fp_rate in (0.01, 0.1):
+            body = server.encode_bloom_filter(ids, 1, fp_rate)
+            others = [f"other-{i}" for i in range(20000)]
+            rate = sum(bloom_contains(body, book_id) for book_id in others) / len(others)
+            self.assertLess(rate, fp_rate * 2, fp_rate)
+
+
+def png(width, height, seed=0):
+    """A valid RGB PNG with some noise in it, made without Pillow."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + bytes(rng.getrandbits(8) for _ in range(width * 3)) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + \
+        chunk(b"IEND", b"")
+
+
+class QuietHandler(server.SpineHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    """
+    Runs the real handler on an ephemeral port over a temporary spines
+    folder holding li_00001.png .. li_00003.png (matched by book ID, so no
+    ABS is needed).
+    """
+
+    SPINES = {"li_00001": (40, 300), "li_00002": (30, 200), "li_00003": (50, 400)}
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="spine-test-")
+        self.spines_dir = os.path.join(self.folder, "spines")
+        os.makedirs(self.spines_dir)
+        for n, (book_id, (width, height)) in enumerate(sorted(self.SPINES.items())):
+            with open(self.spine_path(book_id), "wb") as f:
+                f.write(png(width, height, n))
+
+        self.saved = (server.SPINES_DIR, server.CACHE_DIR)
+        server._override_spines_dir(self.spines_dir)
+        server._override_cache_dir(os.path.join(self.folder, "cache"))
+        self.refresher = server.SpineRefresher()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.snapshot = self.refresher.refresh()
+        server.SpineHandler._byte_cache = server.SpineByteCache(1024 * 1024)
+        server.SpineHandler._on_stale = self.refresher.request_rescan
+
+        self.httpd = server.PooledHTTPServer(("127.0.0.1", 0), QuietHandler, threads=2)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for name in ("_snapshot", "_byte_cache", "_on_stale", "_atlas_builder"):
+            setattr(server.SpineHandler, name, None)
+        server._override_spines_dir(self.saved[0])
+        server._override_cache_dir(self.saved[1])
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def spine_path(self, book_id):
+        return os.path.join(self.spines_dir, f"{book_id}.png")
+
+    def get(self, path, **headers):
+        """GET `path`; header names use _ for -. Returns (status, headers, body)."""
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            conn.request("GET", path, headers={name.replace("_", "-"): value for name, value in headers.items()})
+            response = conn.getresponse()
+            return response.status, response, response.read()
+        finally:
+            conn.close()
+
+
+class SpineValidatorTest(ServerTestCase):
+
+    def test_spine_etag_and_last_modified(self):
+        path = "/api/items/li_00001/spine"
+        status, response, body = self.get(path)
+        self.assertEqual(status, 200)
+        with open(self.spine_path("li_00001"), "rb") as f:
+            self.assertEqual(body, f.read())
+        etag, last_modified = response.getheader("ETag"), response.getheader("Last-Modified")
+        self.assertTrue(etag and last_modified)
+
+        status, response, body = self.get(path, If_None_Match=etag)
+        self.assertEqual((status, body), (304, b""))
+        self.assertEqual(response.getheader("ETag"), etag)
+        self.assertEqual(self.get(path, If_None_Match=f'"other", W/{etag}')[0], 304)
+        self.assertEqual(self.get(path, If_None_Match='"other"')[0], 200)
+
+        self.assertEqual(self.get(path, If_Modified_Since=last_modified)[0], 304)
+        self.assertEqual(self.get(path, If_Modified_Since="Mon, 01 Jan 1990 00:00:00 GMT")[0], 200)
+        # If-None-Match wins over If-Modified-Since
+        self.assertEqual(self.get(path, If_None_Match='"other"', If_Modified_Since=last_modified)[0], 200)
+
+    def test_unknown_spine(self):
+        self.assertEqual(self.get("/api/items/li_nope/spine")[0], 404)
+
+    def test_manifest_etag_per_encoding(self):
+        path = "/api/spines/manifest"
+        for encoding in ("identity", "gzip"):
+            status, response, _ = self.get(path, Accept_Encoding=encoding)
+            self.assertEqual(status, 200)
+            etag = response.getheader("ETag")
+            self.assertEqual(self.get(path, Accept_Encoding=encoding, If_None_Match=etag)[0], 304)
+            self.assertEqual(self.get(path, Accept_Encoding=encoding, If_None_Match='"m-other"')[0], 200)
+        self.assertNotEqual(
+            self.get(path, Accept_Encoding="gzip")[1].getheader("ETag"),
+            self.get(path, Accept_Encoding="identity")[1].getheader("ETag"),
+        )
+
+
+class BlobValidatorTest(ServerTestCase):
+
+    def blob_path(self, book_id):
+        digest = self.snapshot.details[book_id]["sha256"]
+        return digest, server.BLOB_ROUTE + digest
+
+    def test_blob_etag(self):
+        digest, path = self.blob_path("li_00002")
+        status, response, body = self.get(path)
+        self.assertEqual(status, 200)
+        with open(self.spine_path("li_00002"), "rb") as f:
+            self.assertEqual(body, f.read())
+        self.assertEqual(response.getheader("ETag"), f'"{digest}"')
+        self.assertEqual(response.getheader("Cache-Control"), server.IMMUTABLE_CACHE_CONTROL)
+
+        self.assertEqual(self.get(path, If_None_Match=f'"{digest}"')[0], 304)
+        self.assertEqual(self.get(path, If_None_Match="*")[0], 304)
+        self.assertEqual(self.get(path, If_None_Match='"other"')[0], 200)
+        # blobs carry no Last-Modified, so a date alone can't validate them
+        self.assertEqual(self.get(path, If_Modified_Since="Mon, 01 Jan 2035 00:00:00 GMT")[0], 200)
+
+    def test_unknown_blob(self):
+        self.assertEqual(self.get(server.BLOB_ROUTE + "0" * 64)[0], 404)
+
+    def test_file_changed_on_disk(self):
+        # before the first request, so the byte cache can't answer with
+        # the (still correct for the hash) old bytes
+        _, path = self.blob_path("li_00001")
+        with open(self.spine_path("li_00001"), "wb") as f:
+            f.write(png(20, 100, 9))
+
+        self.assertFalse(self.refresher._wake.is_set())
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.get("/api/items/li_00001/spine")[0], 404)
+            self.assertEqual(self.get(path)[0], 404)
+        self.assertTrue(self.refresher._wake.is_set())
+
+
+@unittest.skipUnless(server.Image, "atlases need Pillow")
+class AtlasValidatorTest(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        server.SpineHandler._atlas_builder = server.AtlasBuilder()
+
+    def atlas(self, path):
+        """Ask for an atlas map until it is built."""
+        deadline = time.time() + 10
+        while True:
+            status, response, body = self.get(path)
+            if status != 202 or time.time() > deadline:
+                return status, response, body
+            time.sleep(0.05)
+
+    def test_atlas_etags(self):
+        path = server.ATLAS_ROUTE.rstrip("/") + "?ids=li_00001,li_00002,li_nope&h=100"
+        status, response, body = self.atlas(path)
+        self.assertEqual(status, 200)
+        atlas = json.loads(body)
+        self.assertEqual(response.getheader("ETag"), f'"a-{atlas["key"]}"')
+        self.assertEqual(sorted(atlas["sprites"]), ["li_00001", "li_00002"])
+        self.assertEqual(atlas["missing"], ["li_nope"])
+        self.assertEqual(self.get(path, If_None_Match=response.getheader("ETag"))[0], 304)
+        self.assertEqual(self.get(path, If_None_Match='"a-other"')[0], 200)
+
+        page = atlas["pages"][0]["url"]
+        status, response, body = self.get(page)
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b"\x89PNG"))
+        etag = response.getheader("ETag")
+        self.assertEqual(etag, f'"a-{atlas["key"]}-0.png"')
+        self.assertEqual(response.getheader("Cache-Control"), server.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get(page, If_None_Match=etag)[0], 304)
+        self.assertEqual(self.get(page, If_None_Match='"other"')[0], 200)
+        self.assertEqual(self.get(page, If_Modified_Since="Mon, 01 Jan 2035 00:00:00 GMT")[0], 200)
+        self.assertEqual(self.get(server.ATLAS_ROUTE + atlas["key"] + "/9.png")[0], 404)
+
+    def test_too_many_ids(self):
+        ids = ",".join(f"li_{n:05d}" for n in range(server.BATCH_MAX_IDS + 1))
+        self.assertEqual(self.get(server.ATLAS_ROUTE.rstrip("/") + "?ids=" + ids)[0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()